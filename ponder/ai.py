@@ -1,12 +1,305 @@
+import math
+import os
 import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
 from ponder.tuples import Move, Token
 
 class AI(object):
     def choose_move(self, m, p):
-        places = [(Token(p,token),None,destination) for token in m.colour_hand(p) for destination in m.colour_places(p)]
-        moves = [(None, source, destination) for source,destinations in m.colour_moves(p).items() for destination in destinations]
-        everything = places + moves
-        if len(everything) > 0:
-            return Move(*random.choice(everything))
-        else:
-            return None
\ No newline at end of file
+        return m.random_move(p, random)
+
+# A cheap random player for playouts, which only works out the moves it is going to use.
+# It decides whether to place or move first, then picks a token, and only then works out where that token can go,
+# trying another token if it is stuck. Placing is chosen with weight `place_weight` against 1 for moving,
+# and tokens are picked in proportion to `kind_weights`, so moves are not uniform over all the legal moves.
+# Without an `rng` it uses the `random` module.
+class RolloutPolicy(object):
+    def __init__(self, place_weight=1.0, kind_weights=None, rng=None):
+        self.place_weight = place_weight
+        self.kind_weights = kind_weights or {}
+        self.rng = rng
+
+    # Pick a kind, or a token by its kind, in proportion to the kind weights, or uniformly if they are all zero.
+    def pick(self, rng, items, kinds):
+        weights = [self.kind_weights.get(kind, 1.0) for kind in kinds]
+        if sum(weights) == 0:
+            return rng.choice(items)
+        return rng.choices(items, weights)[0]
+
+    def choose_move(self, m, p):
+        rng = self.rng or random
+        hand = m.colour_hand(p)
+        # The places are only worked out once placing is chosen, and then kept in case there are none.
+        places = None
+        sources = sorted(m.colour_sources(p))
+        while True:
+            can_place = len(hand) > 0 and (places is None or len(places) > 0)
+            if len(sources) == 0 and not can_place:
+                return None
+            if can_place and (len(sources) == 0 or rng.random() * (self.place_weight + 1) < self.place_weight):
+                if places is None:
+                    places = sorted(m.colour_places(p))
+                if len(places) > 0:
+                    kind = self.pick(rng, hand, hand)
+                    return Move(Token(p, kind), None, rng.choice(places))
+                continue
+            source = self.pick(rng, sources, [m.state.tops[source].kind for source in sources])
+            destinations = m.source_moves(source)
+            if len(destinations) > 0:
+                return Move(None, source, rng.choice(sorted(destinations)))
+            sources.remove(source)
+
+# A node in the search tree, for the position reached by playing `move`.
+# `player` is the colour that played the move, and `wins` counts playouts won by that colour, with draws as half a win.
+class Node(object):
+    def __init__(self, move=None, player=None, parent=None):
+        self.move = move
+        self.player = player
+        self.parent = parent
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.wins = 0.0
+
+    # Upper confidence bound for trees: how good this move looks, plus a bonus for not having been tried much.
+    def uct(self, exploration):
+        return self.wins / self.visits + exploration * math.sqrt(math.log(self.parent.visits) / self.visits)
+
+    def expanded(self):
+        return self.untried is not None and len(self.untried) == 0
+
+# Monte Carlo tree search.
+# Each iteration walks down the tree choosing moves by UCT, adds one new node, plays moves from the rollout `policy`
+# to the end of the game (or `rollout_depth` moves, which counts as a draw) and then updates the nodes it passed through.
+# The default policy is a RolloutPolicy, pass policy=AI() for uniformly random playouts.
+# The search stops after `iterations` playouts or `seconds` of thinking, whichever comes first.
+# The model is searched in place with push and pop, so it is left as it was found.
+#
+# With `reuse_tree`, the tree is kept between moves. The next position is looked for in it by hash, up to two moves
+# down from the old root, which covers our move and the opponent's reply, and if it is found its node becomes the
+# new root, so the playouts already spent below it carry over. The rest of the old tree is dropped.
+#
+# With `ponder`, the search carries on in a background thread while the opponent thinks, from the position after
+# the move it chose, until it is asked for its next move. If the opponent's reply is one the pondering got to,
+# its subtree becomes the root of the next search, so the visits spent on it count towards that move.
+# The thread shares the interpreter with the opponent, so this pays off against people and players in other processes.
+# Call `close` to stop pondering when the game is over.
+class MCTSAI(object):
+    def __init__(self, iterations=None, seconds=None, exploration=math.sqrt(2), rollout_depth=200, policy=None, rng=random,
+                 reuse_tree=True, ponder=False):
+        if iterations is None and seconds is None:
+            iterations = 1000
+        self.iterations = iterations
+        self.seconds = seconds
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.policy = policy or RolloutPolicy(rng=rng)
+        self.rng = rng
+        self.reuse_tree = reuse_tree
+        self.ponder = ponder
+        self.playouts = 0
+        self.elapsed = 0.0
+        # The pondering thread, the tree kept from the last search and a copy of the model for the position at its root,
+        # and how many visits the root of the last search started with.
+        self.pondering = None
+        self.stopping = threading.Event()
+        self.tree = None
+        self.pondered = 0
+        self.reused = 0
+
+    # The speed of the last search.
+    def playouts_per_second(self):
+        if self.elapsed == 0:
+            return 0.0
+        return self.playouts / self.elapsed
+
+    def choose_move(self, m, p):
+        assert m.active_player == p
+        self.stop_pondering()
+        root = self.reuse(m)
+        self.reused = root.visits
+        self.search(root, m)
+        if len(root.children) == 0:
+            return None
+        best = max(root.children, key=lambda child: child.visits)
+        if self.ponder:
+            self.start_pondering(best, m)
+        elif self.reuse_tree:
+            self.tree = (root, self.copy(m))
+        return best.move
+
+    def copy(self, m):
+        scratch = type(m)()
+        scratch.from_bytes(m.to_bytes())
+        return scratch
+
+    # The node for this position from the kept tree, detached from its parent, or else a new node.
+    def reuse(self, m):
+        tree, self.tree = self.tree, None
+        if tree is not None:
+            node = self.find(*tree, m.hash, 2)
+            if node is not None:
+                node.parent = None
+                return node
+        return Node()
+
+    # Find the node for the position with this hash, no more than `depth` moves below `node`.
+    def find(self, node, scratch, hash, depth):
+        if scratch.hash == hash:
+            return node
+        if depth > 0:
+            for child in node.children:
+                scratch.push(child.move)
+                found = self.find(child, scratch, hash, depth-1)
+                scratch.pop()
+                if found is not None:
+                    return found
+        return None
+
+    # Search the position after `node`'s move on a copy of the model, until stop_pondering is called.
+    def start_pondering(self, node, m):
+        scratch = self.copy(m)
+        scratch.push(node.move)
+        if scratch.winner() is not None:
+            return
+        node.parent = None
+        self.tree = (node, scratch)
+        self.pondered = 0
+        self.stopping.clear()
+        self.pondering = threading.Thread(target=self.ponder_search, args=(node, scratch), daemon=True)
+        self.pondering.start()
+
+    def ponder_search(self, root, m):
+        while not self.stopping.is_set():
+            self.iterate(root, m)
+            self.pondered += 1
+
+    def stop_pondering(self):
+        if self.pondering is not None:
+            self.stopping.set()
+            self.pondering.join()
+            self.pondering = None
+
+    def close(self):
+        self.stop_pondering()
+        self.tree = None
+
+    def search(self, root, m):
+        start = time.perf_counter()
+        self.playouts = 0
+        while True:
+            self.elapsed = time.perf_counter() - start
+            if self.iterations is not None and self.playouts >= self.iterations:
+                break
+            if self.seconds is not None and self.elapsed >= self.seconds:
+                break
+            self.iterate(root, m)
+            self.playouts += 1
+
+    # The moves from a position, with a pass if there is nothing else to do, or none at all if the game is over.
+    def untried_moves(self, m):
+        if m.winner() is not None:
+            return []
+        return list(m.legal_moves(m.active_player)) or [None]
+
+    def iterate(self, root, m):
+        node = root
+        depth = 0
+
+        while node.expanded() and len(node.children) > 0:
+            node = max(node.children, key=lambda child: child.uct(self.exploration))
+            m.push(node.move)
+            depth += 1
+
+        if node.untried is None:
+            node.untried = self.untried_moves(m)
+        if len(node.untried) > 0:
+            move = node.untried.pop(self.rng.randrange(len(node.untried)))
+            child = Node(move, m.active_player, node)
+            node.children.append(child)
+            node = child
+            m.push(move)
+            depth += 1
+
+        winner = self.rollout(m)
+
+        while node is not None:
+            node.visits += 1
+            if winner is None:
+                node.wins += 0.5
+            elif winner == node.player:
+                node.wins += 1
+            node = node.parent
+
+        for _ in range(depth):
+            m.pop()
+
+    def rollout(self, m):
+        depth = 0
+        winner = m.winner()
+        while winner is None and depth < self.rollout_depth:
+            m.push(self.policy.choose_move(m, m.active_player))
+            depth += 1
+            winner = m.winner()
+        for _ in range(depth):
+            m.pop()
+        return winner
+
+# Search a position from scratch in a worker process, returning the visits to each move at the root and the number of playouts.
+# The `random` module is seeded too, as forked workers all start with the same state and a rollout policy may be using it.
+def search_root(model_type, data, options, seed):
+    random.seed(seed)
+    m = model_type()
+    m.from_bytes(data)
+    searcher = MCTSAI(rng=random.Random(seed), **options)
+    root = Node()
+    searcher.search(root, m)
+    return {child.move: child.visits for child in root.children}, searcher.playouts
+
+# Root parallel Monte Carlo tree search.
+# Every worker process grows its own tree from the same position with the same budget,
+# then the visits to each move at the root are added up and the most visited move is played.
+# A rollout `policy` has to be picklable to be sent to the workers.
+# The pool is started on the first move and kept until `close` is called.
+# The workers' trees are thrown away after every move, so `reuse_tree` and `ponder` can't be used.
+class ParallelMCTSAI(MCTSAI):
+    def __init__(self, workers=None, **options):
+        for option in ('reuse_tree', 'ponder'):
+            if options.pop(option, False):
+                raise ValueError('%s is not supported by ParallelMCTSAI' % option)
+        super().__init__(reuse_tree=False, ponder=False, **options)
+        self.workers = workers or os.cpu_count()
+        self.options = {'iterations': self.iterations, 'seconds': self.seconds,
+                        'exploration': self.exploration, 'rollout_depth': self.rollout_depth}
+        if 'policy' in options:
+            self.options['policy'] = options['policy']
+        self.pool = None
+
+    def choose_move(self, m, p):
+        assert m.active_player == p
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        start = time.perf_counter()
+        data = m.to_bytes()
+        futures = [self.pool.submit(search_root, type(m), data, self.options, self.rng.getrandbits(64))
+            for _ in range(self.workers)]
+        visits = Counter()
+        self.playouts = 0
+        for future in futures:
+            root_visits, playouts = future.result()
+            visits.update(root_visits)
+            self.playouts += playouts
+        self.elapsed = time.perf_counter() - start
+        if len(visits) == 0:
+            return None
+        return max(visits, key=visits.get)
+
+    def close(self):
+        super().close()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
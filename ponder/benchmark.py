@@ -0,0 +1,71 @@
+# Time move generation per node for each model on the same positions from seeded random games,
+# with each model's cache cleared before every call so nothing is remembered between them.
+# Each time is the best of several runs, as timings on a busy machine are noisy, and is compared with the dict model.
+#
+# Positions are passed between models in their binary form, so models on hex ids are timed on the same positions too.
+
+import argparse
+import random
+import time
+
+from ponder import model, perft
+
+# Each one is a name and a function of the model that does the work being timed.
+tasks = (
+    ('legal_moves', lambda m: [m.legal_moves(colour) for colour in model.colours]),
+    ('move_sources', lambda m: m.move_sources()),
+)
+
+# The binary form of every position in random games of random length, played until there are at least `nodes`.
+def random_positions(nodes, seed=0, max_plies=60):
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < nodes:
+        m = model.Model()
+        for _ in range(rng.randrange(max_plies)):
+            if m.winner() is not None:
+                break
+            m.push(m.random_move(m.active_player, rng))
+            positions.append(m.to_bytes())
+    return positions[:nodes]
+
+# The best of `repeat` runs of a task over the positions, in microseconds per node.
+def time_task(model_type, positions, work, repeat=5):
+    models = []
+    for data in positions:
+        m = model_type()
+        m.from_bytes(data)
+        models.append(m)
+    best = None
+    for _ in range(repeat):
+        elapsed = 0.0
+        for m in models:
+            m.cache.clear()
+            start = time.perf_counter()
+            work(m)
+            elapsed += time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return 1e6 * best / len(models)
+
+# {task: {model name: microseconds per node}} for the named model types.
+def benchmark(names, positions, repeat=5):
+    return {task: {name: time_task(perft.model_types[name], positions, work, repeat) for name in names}
+        for task, work in tasks}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time move generation per node for each model on positions from random games.')
+    parser.add_argument('models', nargs='*', default=sorted(perft.model_types),
+        help='models to time, from %s, defaults to all of them' % ', '.join(sorted(perft.model_types)))
+    parser.add_argument('--nodes', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for name in args.models:
+        if name not in perft.model_types:
+            parser.error('unknown model %s' % name)
+
+    names = ['dict'] + [name for name in args.models if name != 'dict']
+    results = benchmark(names, random_positions(args.nodes, args.seed), args.repeat)
+    for task, times in results.items():
+        for name in names:
+            print('%-12s %-8s %8.1f us/node, %5.2fx dict' % (task, name, times[name], times['dict'] / times[name]))
@@ -0,0 +1,121 @@
+# An opening book: statistics for the moves played from early positions in a set of game records.
+#
+# The book is a file of fixed-size records sorted by position, each holding the canonical hash of a position,
+# a move in that position's canonical frame, and how many games played it, won and drew for the side that moved.
+# Positions equivalent under translation, rotation and reflection share their entries, as do equivalent moves in them.
+# Lookups binary search a memory map of the file, so the book is never read into memory.
+
+import argparse
+import mmap
+import os
+import struct
+from collections import defaultdict
+
+from ponder import hexes, model, records
+from ponder.model import token_codes, tokens
+from ponder.tuples import Move
+
+record = struct.Struct('<QB3b3bIII')
+movement = 0xff
+
+# Moves in the canonical frame of a position, and back again.
+def to_canonical(move, symmetry, origin):
+    def convert(hex):
+        return hexes.sub(hexes.transform(symmetry, hex), origin)
+    return Move(move.token, move.source and convert(move.source), convert(move.destination))
+
+def from_canonical(move, symmetry, origin):
+    def convert(hex):
+        return hexes.transform(hexes.inverse(symmetry), hexes.add(hex, origin))
+    return Move(move.token, move.source and convert(move.source), convert(move.destination))
+
+# Moves which are the same in a symmetrical position are stored as one, the lowest of them in the canonical frame.
+def canonical_move(m, move):
+    return min(to_canonical(move, symmetry, origin) for symmetry, origin in m.canonical_frames()[1])
+
+def pack(hash, move, games, wins, draws):
+    code = movement if move.token is None else token_codes[move.token]
+    return record.pack(hash, code, *(move.source or hexes.centre), *move.destination, games, wins, draws)
+
+def unpack(data, offset):
+    hash, code, sx, sy, sz, dx, dy, dz, games, wins, draws = record.unpack_from(data, offset)
+    if code == movement:
+        move = Move(None, (sx, sy, sz), (dx, dy, dz))
+    else:
+        move = Move(tokens[code], None, (dx, dy, dz))
+    return hash, move, games, wins, draws
+
+# Count the moves played in the first `plies` moves of every game in the record files,
+# and write those played in at least `min_games` games to a book at `path`.
+def build(record_paths, path, plies=12, min_games=1):
+    stats = defaultdict(lambda: [0, 0, 0])
+    for record_path in record_paths:
+        for winner, moves in records.read_games(record_path):
+            m = model.Model()
+            for move in moves[:plies]:
+                if move is not None:
+                    entry = stats[(m.canonical_hash(), canonical_move(m, move))]
+                    entry[0] += 1
+                    entry[1] += winner == m.active_player
+                    entry[2] += winner is None
+                m.push(move)
+    entries = sorted((item for item in stats.items() if item[1][0] >= min_games), key=lambda item: (item[0][0], -item[1][0]))
+    with open(path, 'wb') as f:
+        for (hash, move), entry in entries:
+            f.write(pack(hash, move, *entry))
+    return len(entries)
+
+class Book(object):
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size // record.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size > 0 else b''
+
+    def close(self):
+        if self.size > 0:
+            self.data.close()
+        self.file.close()
+
+    def hash_at(self, index):
+        return struct.unpack_from('<Q', self.data, index * record.size)[0]
+
+    # The entries for a position as (move, games, wins, draws), most played first, with moves in the position's own frame.
+    def lookup(self, m):
+        _, symmetry, origin = m.canonical()
+        hash = m.canonical_hash()
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.hash_at(middle) < hash:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size and self.hash_at(low) == hash:
+            _, move, games, wins, draws = unpack(self.data, low * record.size)
+            entries.append((from_canonical(move, symmetry, origin), games, wins, draws))
+            low += 1
+        return entries
+
+# Play the most played legal book move, or ask the `fallback` player if the position is not in the book.
+class BookAI(object):
+    def __init__(self, book, fallback, min_games=1):
+        self.book = book
+        self.fallback = fallback
+        self.min_games = min_games
+
+    def choose_move(self, m, p):
+        for move, games, wins, draws in self.book.lookup(m):
+            if games >= self.min_games and move in m.legal_move_set(p):
+                return move
+        return self.fallback.choose_move(m, p)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build an opening book from game records.')
+    parser.add_argument('records', nargs='+', help='game record files')
+    parser.add_argument('book', help='book file to write')
+    parser.add_argument('--plies', type=int, default=12, help='how many moves into each game to record')
+    parser.add_argument('--min-games', type=int, default=1, help='leave out moves played in fewer games than this')
+    args = parser.parse_args()
+
+    print(build(args.records, args.book, args.plies, args.min_games), 'entries')
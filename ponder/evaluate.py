@@ -0,0 +1,73 @@
+# A static evaluation of positions, for scoring many leaves of a search at once instead of playing each one out.
+#
+# Positions are packed into one array in their Model.to_bytes form. Features that only need the tokens on the board,
+# the neighbours of each bee and the tokens left in hand, are worked out for the whole batch with array operations.
+# Features that need move generation, the pinned tokens and the mobility of each side, come from the models.
+# Each feature is an array with a row per position and a column per colour, in the order of model.colours.
+
+import numpy as np
+
+from ponder import hexes, model
+
+# How much each feature is worth. Features are counted as the opponent's minus our own,
+# except mobility and tokens in hand which are our own minus the opponent's.
+weights = {'bee_neighbours': 1.0, 'pinned': 0.3, 'mobility': 0.05, 'hand': 0.1}
+
+bee_codes = np.array([model.token_codes[model.Token(colour, model.bee)] for colour in model.colours])
+token_count = sum(model.starting_hand.values())
+
+def encode(models):
+    data = b''.join(m.to_bytes() for m in models)
+    return np.frombuffer(data, dtype=np.uint8).reshape(len(models), model.bytes_size)
+
+# The features that only need the tokens on the board, from positions encoded as an array.
+def board_features(positions):
+    slots = positions[:, 1:].reshape(len(positions), model.token_slots, model.slot.size)
+    xs = slots[:, :, 0].astype(np.int8).astype(np.int32)
+    ys = slots[:, :, 1].astype(np.int8).astype(np.int32)
+    zs = slots[:, :, 2].astype(np.int8)
+    codes = slots[:, :, 3]
+    placed = codes != model.empty_slot
+    colours = np.where(placed, codes // len(model.kinds), -1)
+    active = placed & (zs == 0)
+
+    hand = np.stack([token_count - (colours == i).sum(axis=1) for i in range(len(model.colours))], axis=1)
+
+    bee_neighbours = np.zeros((len(positions), len(model.colours)), dtype=np.int32)
+    for i, code in enumerate(bee_codes):
+        is_bee = codes == code
+        has_bee = is_bee.any(axis=1)
+        bee = is_bee.argmax(axis=1)
+        dx = xs - xs[np.arange(len(positions)), bee][:, None]
+        dy = ys - ys[np.arange(len(positions)), bee][:, None]
+        neighbour = np.zeros_like(active)
+        for offset in hexes.offsets:
+            neighbour |= (dx == offset[0]) & (dy == offset[1])
+        bee_neighbours[:, i] = np.where(has_bee, (neighbour & active).sum(axis=1), 0)
+
+    return {'bee_neighbours': bee_neighbours, 'hand': hand}
+
+# The features that need move generation, from the models.
+def model_features(models):
+    pinned = np.array([[len(m.state.active_colours[colour] - m.move_sources()) for colour in model.colours] for m in models])
+    mobility = np.array([[m.count_moves(colour) for colour in model.colours] for m in models])
+    return {'pinned': pinned.reshape(len(models), len(model.colours)),
+            'mobility': mobility.reshape(len(models), len(model.colours))}
+
+def features(models):
+    return {**board_features(encode(models)), **model_features(models)}
+
+# Score each position as the chance that `colour` wins, between 0 and 1.
+# A surrounded bee scores 0 or 1 outright.
+def evaluate(models, colour, weights=weights):
+    f = features(models)
+    us = model.colours.index(colour)
+    them = 1 - us
+    score = (weights['bee_neighbours'] * (f['bee_neighbours'][:, them] - f['bee_neighbours'][:, us]) +
+             weights['pinned'] * (f['pinned'][:, them] - f['pinned'][:, us]) +
+             weights['mobility'] * (f['mobility'][:, us] - f['mobility'][:, them]) +
+             weights['hand'] * (f['hand'][:, us] - f['hand'][:, them]))
+    chance = 1 / (1 + np.exp(-score))
+    chance = np.where(f['bee_neighbours'][:, them] == 6, 1.0, chance)
+    chance = np.where(f['bee_neighbours'][:, us] == 6, 0.0, chance)
+    return chance
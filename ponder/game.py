@@ -2,38 +2,49 @@
 
 # An interactive wrapper for the model
 
-from ponder.model import black
+import time
 
 class Game(object):
-    def __init__(self, model, players):
+    def __init__(self, model, players, trusted=False):
         self.model = model
-        self.active_player = black
         self.players = players
+        self.trusted = trusted
 
+    # The model keeps track of whose turn it is, as it is part of the position.
+    @property
+    def active_player(self):
+        return self.model.active_player
+
+    # A pass is only legal when there is nothing else to do.
+    def is_legal(self, move):
+        return self.model.is_legal(self.active_player, move)
+
+    # Unless the game is `trusted` to only be given legal moves, as between engines, every move is checked first.
     def make_move(self, move):
-        if move is None:
-            pass
-        elif (
-            move.token is not None and
-            move.source is None and
-            move.token.colour == self.active_player and
-            move.token.kind in self.model.colour_hand(self.active_player) and
-            move.destination in self.model.colour_places(self.active_player)):
-            self.model.add(move.token, move.destination)
-        elif (
-            move.token is None and
-            move.source is not None and
-            move.source in self.model.colour_hexes(self.active_player) & self.model.move_sources() and
-            move.destination in self.model.colour_moves(self.active_player)[move.source]):
-            self.model.move(move.source, move.destination)
-        else:
+        if not self.trusted and not self.is_legal(move):
             raise ValueError
+        self.model.push(move)
 
-    def play(self):
-        while self.model.winner() is None:
-            self.make_move(self.players[self.active_player].choose_move(self.model, self.active_player))
-            self.active_player = self.model.colour_opposite(self.active_player)
-        return self.model.winner()
+    # Play until someone wins, or for at most `max_plies` moves, after which the game is a draw and the winner is None.
+    # With `profile`, the model is profiled for the game and the winner comes back with the profiler's report,
+    # which also has the number of plies and the time each player spent choosing moves.
+    def play(self, max_plies=None, profile=False):
+        profiler = self.model.profile() if profile else None
+        thinking = {colour: 0.0 for colour in self.players}
+        plies = 0
+        try:
+            while self.model.winner() is None and (max_plies is None or plies < max_plies):
+                start = time.perf_counter()
+                move = self.players[self.active_player].choose_move(self.model, self.active_player)
+                thinking[self.active_player] += time.perf_counter() - start
+                self.make_move(move)
+                plies += 1
+        finally:
+            if profiler is not None:
+                profiler.disable()
+        if profiler is None:
+            return self.model.winner()
+        return self.model.winner(), {**profiler.report(), 'plies': plies, 'thinking': thinking}
 
     
 
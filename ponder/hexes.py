@@ -44,8 +44,34 @@ opposites = {offsets[i]:offsets[i+3] for i in range(6)}
 def opposite(offset):
     return opposites[offset]
 
+# Whole board symmetries: the six rotations about the centre, each with and without a reflection.
+# Each one is a linear map of x and y, (a,b,c,d) taking (x,y) to (a*x + b*y, c*x + d*y), and leaves z alone.
+# Rotating one step clockwise takes (x,y) to (-y,x+y), and reflecting swaps x and y.
+def compose(symmetry1, symmetry2):
+    a1, b1, c1, d1 = symmetry1
+    a2, b2, c2, d2 = symmetry2
+    return (a1*a2 + b1*c2, a1*b2 + b1*d2, c1*a2 + d1*c2, c1*b2 + d1*d2)
+
+identity = (1,0,0,1)
+rotation = (0,-1,1,1)
+reflection = (0,1,1,0)
+rotations = [identity]
+for _ in range(5):
+    rotations.append(compose(rotation, rotations[-1]))
+symmetries = tuple(rotations + [compose(reflection, symmetry) for symmetry in rotations])
+inverses = {symmetry: next(other for other in symmetries if compose(other, symmetry) == identity) for symmetry in symmetries}
+
+def transform(symmetry, hex):
+    a, b, c, d = symmetry
+    return (a*hex[0] + b*hex[1], c*hex[0] + d*hex[1], hex[2])
+
+def inverse(symmetry):
+    return inverses[symmetry]
+
+# Written out in full, in the same order as offsets, as it is called for nearly every hex the model looks at.
 def neighbours(hex):
-    return set(add(hex,offset) for offset in offsets)
+    x, y, z = hex
+    return {(x,y-1,z), (x+1,y-1,z), (x+1,y,z), (x,y+1,z), (x-1,y+1,z), (x-1,y,z)}
 
 def is_active(hex):
     return hex[2] == 0
@@ -61,3 +87,17 @@ def save(hex):
 
 def load(string):
     return tuple(int(c) for c in string.split(','))
+
+# Hexes here are already 3-tuples. These match the functions in hexids, which converts integer ids to and from tuples.
+def to_tuple(hex):
+    return hex
+
+def from_tuple(hex):
+    return hex
+
+# How far a hex is down its stack from the top of the hive, and the hex `depth` further down.
+def depth(hex):
+    return -hex[2]
+
+def lower(hex, depth):
+    return (hex[0], hex[1], hex[2]-depth)
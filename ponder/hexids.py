@@ -0,0 +1,119 @@
+# An alternative to the hexes module where every hex is a small integer instead of a 3-tuple.
+# The ids cover a bounded grid, `width` columns square and `levels` deep, with id (level*area + y*width + x)
+# for the hex (x-half, y-half, -level). Adding hexes is adding ids, and the neighbours, rotations
+# and stack below of a hex come from tables worked out once, so move generation allocates nothing for them.
+#
+# The functions here mirror those in hexes, so a Model can run on either. Models on ids take and give
+# moves as ids too, only their saved and binary forms are the same as the tuple model's.
+
+import sys
+
+from ponder import hexes, model, ring
+
+width = 64
+area = width * width
+levels = 5
+half = width // 2
+
+# The hive has to keep `margin` columns away from the edge of the grid,
+# so every hex the model looks at has all six of its neighbours on the grid.
+margin = 2
+
+def from_tuple(hex):
+    x, y, level = hex[0] + half, hex[1] + half, -hex[2]
+    if not (0 <= x < width and 0 <= y < width and 0 <= level < levels):
+        raise ValueError('hex outside the id grid')
+    return level*area + y*width + x
+
+def to_tuple(id):
+    level, column = divmod(id, area)
+    y, x = divmod(column, width)
+    return (x - half, y - half, -level)
+
+def on_grid(hex):
+    return -half <= hex[0] < width-half and -half <= hex[1] < width-half
+
+def inner(id):
+    x, y = id % width, id % area // width
+    return margin <= x < width-margin and margin <= y < width-margin
+
+centre = from_tuple(hexes.centre)
+
+# Offsets are differences between ids, in the same clockwise order as hexes.offsets.
+offsets = ring.Ring(x + y*width for x, y, z in hexes.offsets)
+
+up = -area
+down = area
+
+def add(hex1, hex2):
+    return hex1 + hex2
+
+def sub(hex1, hex2):
+    return hex1 - hex2
+
+left_rotations  = {offsets[i]:offsets[i-1] for i in range(6)}
+right_rotations = {offsets[i]:offsets[i+1] for i in range(6)}
+left = hexes.left
+right = hexes.right
+rotations = {left: left_rotations, right: right_rotations}
+def rotate(dir, hex, pivot=centre):
+    if dir not in rotations or hex - pivot not in offsets:
+        raise ValueError
+    return pivot + rotations[dir][hex - pivot]
+
+opposites = {offsets[i]:offsets[i+3] for i in range(6)}
+def opposite(offset):
+    return opposites[offset]
+
+# The neighbours of every column on the top level, leaving out any that would be off the grid.
+neighbour_table = tuple(
+    frozenset(from_tuple(neighbour) for neighbour in hexes.neighbours(to_tuple(id)) if on_grid(neighbour))
+    for id in range(area))
+
+# Neighbours come straight from the table, so they are frozen.
+def neighbours(hex):
+    if hex < area:
+        return neighbour_table[hex]
+    level = hex - hex % area
+    return frozenset(neighbour + level for neighbour in neighbour_table[hex % area])
+
+def is_active(hex):
+    return hex < area
+
+def make_active(hex):
+    return hex % area
+
+def depth(hex):
+    return hex // area
+
+def lower(hex, depth):
+    return hex + depth*area
+
+def merge(sets_of_hexes):
+    return set().union(*sets_of_hexes)
+
+def save(hex):
+    return hexes.save(to_tuple(hex))
+
+def load(string):
+    return from_tuple(hexes.load(string))
+
+class State(model.State):
+    hexes = sys.modules[__name__]
+
+    def push_top(self, column, token):
+        if not inner(column):
+            raise ValueError('hive does not fit in the id grid')
+        super().push_top(column, token)
+
+    def fill(self, columns):
+        if not all(inner(column) for column in columns):
+            raise ValueError('hive does not fit in the id grid')
+        super().fill(columns)
+
+class Model(model.Model):
+    hexes = sys.modules[__name__]
+
+    def __init__(self):
+        super().__init__()
+        self.state = State()
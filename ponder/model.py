@@ -2,10 +2,15 @@
 # A model of a Hive game.
 # It stores the current position of tokens in play and supplies available moves for both players.
 
+import functools
+import random
+import struct
+from collections import defaultdict
+from collections.abc import MutableMapping
 from contextlib import contextmanager
 
-from ponder import hexes, ring
-from ponder.tuples import Token, CrawlMoves
+from ponder import hexes, profiling, ring
+from ponder.tuples import Move, Token, CrawlMoves
 
 white = 'white'
 black = 'black'
@@ -19,31 +24,341 @@ spider = 'spider'
 kinds = (bee, hopper, ant, beetle, spider)
 starting_hand = {bee: 1, hopper: 3, ant: 3, beetle:2, spider: 2}
 
+# The binary form of a position is a byte for the side to move, then a slot for every token in the game,
+# each holding the x, y and z of its hex as signed bytes and a byte for the token. Unused slots come last.
+tokens = tuple(Token(colour, kind) for colour in colours for kind in kinds)
+token_codes = {token: code for code, token in enumerate(tokens)}
+empty_slot = 0xff
+slot = struct.Struct('<bbbB')
+token_slots = sum(starting_hand.values()) * len(colours)
+bytes_size = 1 + token_slots * slot.size
+
+# Zobrist hashing: every token at every hex gets a random 64 bit key, and a position hashes to the XOR
+# of the keys of its tokens, so adding or removing a token updates the hash with a single XOR.
+# Keys are seeded from their names so that hashes agree between processes and runs.
+zobrist_keys = {}
+def zobrist_key(*names):
+    if names not in zobrist_keys:
+        zobrist_keys[names] = random.Random(repr(names)).getrandbits(64)
+    return zobrist_keys[names]
+
+# The key XORed in when it is white's turn.
+white_to_move = zobrist_key(white)
+
+# Cache a method's results for each position, keyed by the hash of the board.
+# Results are shared between callers, so they should be immutable.
+def cached(method):
+    @functools.wraps(method)
+    def cached_method(self, *args):
+        key = (method.__name__, self.state.hash, args)
+        if key not in self.cache:
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[key] = method(self, *args)
+        return self.cache[key]
+    return cached_method
+
+# The board, as a stack of tokens for each column of the hive, bottom first, keyed by the hex at the top of the column.
+# Tokens only ever go on and come off the top of a stack, with push_top and pop_top, so a beetle climbing on or off
+# is one append or pop however tall the stack is, and the tokens underneath are never touched.
+# Indexes of the tops of the stacks are kept up to date as they change, and everything the model asks
+# about the board is answered from them, so questions about the top of the hive never look at buried tokens.
+# Every token by colour and by kind is indexed too, as its column and height from the bottom of the stack,
+# which don't change as beetles come and go.
+#
+# It also works as a mapping of hex -> token for every token in the hive, with buried tokens at negative z,
+# counting down from the top of their stack. Writing a token into a hex replaces the token there,
+# or goes under the bottom of the stack if the hex is just beneath it.
+class State(MutableMapping):
+
+    hexes = hexes
+
+    def __init__(self):
+        self.columns = {}
+        self.tops = {}
+        self.active = set()
+        self.active_colours = {colour: set() for colour in colours}
+        self.colours = {colour: set() for colour in colours}
+        self.kinds = {kind: set() for kind in kinds}
+        self.counts = defaultdict(int)
+        self.placed = {colour: 0 for colour in colours}
+        self.bee_columns = {colour: None for colour in colours}
+        self.neighbour_counts = defaultdict(int)
+        self.size = 0
+        self.hash = 0
+
+    # Tokens are hashed by their column and height from the bottom of the stack too.
+    def push_top(self, column, token):
+        stack = self.columns.get(column)
+        if stack is None:
+            stack = self.columns[column] = []
+            self.active.add(column)
+            for neighbour in self.hexes.neighbours(column):
+                self.neighbour_counts[neighbour] += 1
+        else:
+            self.active_colours[stack[-1].colour].discard(column)
+        self.hash ^= zobrist_key(column, len(stack), token)
+        self.colours[token.colour].add((column, len(stack)))
+        self.kinds[token.kind].add((column, len(stack)))
+        stack.append(token)
+        self.tops[column] = token
+        self.active_colours[token.colour].add(column)
+        self.counts[token] += 1
+        self.placed[token.colour] += 1
+        if token.kind == bee:
+            self.bee_columns[token.colour] = column
+        self.size += 1
+
+    def pop_top(self, column):
+        stack = self.columns[column]
+        token = stack.pop()
+        self.hash ^= zobrist_key(column, len(stack), token)
+        self.active_colours[token.colour].discard(column)
+        self.colours[token.colour].discard((column, len(stack)))
+        self.kinds[token.kind].discard((column, len(stack)))
+        self.counts[token] -= 1
+        self.placed[token.colour] -= 1
+        if token.kind == bee:
+            self.bee_columns[token.colour] = None
+        if len(stack) > 0:
+            self.tops[column] = stack[-1]
+            self.active_colours[stack[-1].colour].add(column)
+        else:
+            del self.columns[column]
+            del self.tops[column]
+            self.active.discard(column)
+            for neighbour in self.hexes.neighbours(column):
+                self.neighbour_counts[neighbour] -= 1
+        self.size -= 1
+        return token
+
+    # Fill an empty state with whole stacks at once, {column: [token, ...]} with the bottom token first,
+    # building the indexes in one pass rather than a token at a time. The state keeps the lists.
+    def fill(self, columns):
+        self.columns = columns
+        self.tops = {column: stack[-1] for column, stack in columns.items()}
+        self.active = set(columns)
+        for column, stack in columns.items():
+            for neighbour in self.hexes.neighbours(column):
+                self.neighbour_counts[neighbour] += 1
+            self.active_colours[stack[-1].colour].add(column)
+            for height, token in enumerate(stack):
+                self.hash ^= zobrist_key(column, height, token)
+                self.colours[token.colour].add((column, height))
+                self.kinds[token.kind].add((column, height))
+                self.counts[token] += 1
+                self.placed[token.colour] += 1
+                if token.kind == bee:
+                    self.bee_columns[token.colour] = column
+            self.size += len(stack)
+
+    # The number of tokens in the stack at a column.
+    def height(self, column):
+        stack = self.columns.get(column)
+        return 0 if stack is None else len(stack)
+
+    # The hex of the token at a height from the bottom of a column's stack.
+    def hex_at(self, column, height):
+        return self.hexes.lower(column, len(self.columns[column]) - 1 - height)
+
+    def __getitem__(self, hex):
+        if self.hexes.is_active(hex):
+            return self.tops[hex]
+        stack = self.columns.get(self.hexes.make_active(hex), ())
+        depth = self.hexes.depth(hex)
+        if depth >= len(stack):
+            raise KeyError(hex)
+        return stack[-1-depth]
+
+    def __contains__(self, hex):
+        if self.hexes.is_active(hex):
+            return hex in self.tops
+        return self.hexes.depth(hex) < self.height(self.hexes.make_active(hex))
+
+    def __len__(self):
+        return self.size
+
+    # Every hex, working down each stack from the top.
+    def __iter__(self):
+        for column, stack in list(self.columns.items()):
+            for depth in range(len(stack)):
+                yield self.hexes.lower(column, depth)
+
+    # Editing a stack in the middle takes it down and builds it back up again.
+    def rebuild(self, column, edit):
+        stack = list(self.columns.get(column, ()))
+        while column in self.columns:
+            self.pop_top(column)
+        edit(stack)
+        for token in stack:
+            self.push_top(column, token)
+
+    def __setitem__(self, hex, token):
+        column, depth = self.hexes.make_active(hex), self.hexes.depth(hex)
+        height = self.height(column)
+        if depth == 0 and height == 0:
+            self.push_top(column, token)
+        elif depth < height:
+            def edit(stack):
+                stack[-1-depth] = token
+            self.rebuild(column, edit)
+        elif depth == height:
+            self.rebuild(column, lambda stack: stack.insert(0, token))
+        else:
+            raise ValueError('no token under %s to put %s on' % (self.hexes.save(hex), token.kind))
+
+    def __delitem__(self, hex):
+        column, depth = self.hexes.make_active(hex), self.hexes.depth(hex)
+        if depth >= self.height(column):
+            raise KeyError(hex)
+        elif depth == 0:
+            self.pop_top(column)
+        else:
+            self.rebuild(column, lambda stack: stack.pop(-1-depth))
+
+    # Each colour's bee, buried or not.
+    @property
+    def bees(self):
+        return {colour: None if column is None else
+            self.hexes.lower(column, self.columns[column][::-1].index(Token(colour, bee)))
+            for colour, column in self.bee_columns.items()}
+
 class Model(object):
 
+    # The coordinate layer hexes are expressed in, hexes for 3-tuples or hexids for integer ids.
+    hexes = hexes
+    cache_size = 4096
+
     def __init__(self):
-        self.state = {}
+        self.state = State()
+        self.active_player = black
+        self.history = []
+        self.cache = {}
+
+    # A 64 bit hash of the position, covering every token, its hex and height in the hive, and the side to move.
+    @property
+    def hash(self):
+        if self.active_player == white:
+            return self.state.hash ^ white_to_move
+        return self.state.hash
+
+    # Positions are the same game under translation, rotation and reflection.
+    # The canonical form of a position is the one of its 12 rotations and reflections with the lowest hash,
+    # translated so that its lowest hex is at the centre. Returns that hash, the symmetry, and the hex moved to the centre,
+    # so a hex maps to the canonical form by hexes.sub(hexes.transform(symmetry, hex), origin).
+    def canonical(self):
+        hash, frames = self.canonical_frames()
+        return (hash, *frames[0])
+
+    # The canonical hash, and every (symmetry, origin) that takes the position to its canonical form.
+    # There is more than one when the position is symmetrical.
+    @cached
+    def canonical_frames(self):
+        items = [(*self.hexes.to_tuple(column)[:2], height, token)
+            for column, stack in self.state.columns.items() for height, token in enumerate(stack)]
+        canonical = None
+        frames = []
+        for symmetry in hexes.symmetries:
+            a, b, c, d = symmetry
+            transformed = [(a*x + b*y, c*x + d*y, height, token) for x, y, height, token in items]
+            origin = (*min(transformed)[:2], 0) if len(transformed) > 0 else hexes.centre
+            hash = 0
+            for x, y, height, token in transformed:
+                hash ^= zobrist_key((x - origin[0], y - origin[1], 0), height, token)
+            if canonical is None or hash < canonical:
+                canonical = hash
+                frames = []
+            if hash == canonical:
+                frames.append((symmetry, origin))
+        return canonical, tuple(frames)
+
+    # A hash that is the same for every position equivalent to this one, including the side to move.
+    def canonical_hash(self):
+        if self.active_player == white:
+            return self.canonical()[0] ^ white_to_move
+        return self.canonical()[0]
+
+    # Start counting calls and time in the move generation functions, until the Profiler returned is disabled.
+    # See profiling.py.
+    def profile(self):
+        return profiling.Profiler(self).enable()
+
+    def end_turn(self):
+        self.active_player = self.colour_opposite(self.active_player)
+
+    # Play a move for the side to move and end the turn, keeping the move so it can be taken back by pop.
+    # A move of None is a pass.
+    def push(self, move):
+        if move is None:
+            pass
+        elif move.source is None:
+            self.add(move.token, move.destination)
+        else:
+            self.move(move.source, move.destination)
+        self.history.append(move)
+        self.end_turn()
+
+    # Take back the last move pushed. Moves stack on top of the hive and come back off the top,
+    # so moving a token back to its source undoes it exactly, even for beetles.
+    def pop(self):
+        move = self.history.pop()
+        self.end_turn()
+        if move is None:
+            pass
+        elif move.source is None:
+            self.remove(move.destination)
+        else:
+            self.move(move.destination, move.source)
+        return move
 
     def save(self):
-        return '|'.join(':'.join((hexes.save(loc),*self.state[loc])) for loc in sorted(self.state.keys()))
+        return '|'.join(':'.join((self.hexes.save(loc),*self.state[loc])) for loc in sorted(self.state.keys(), key=self.hexes.to_tuple))
 
+    # Tokens are written in from the top of the hive down, so each one goes under the stack above it.
     def load(self, state):
+        if len(state) == 0:
+            return
+        items = []
         for item in state.split('|'):
             loc, colour, kind = item.split(':')
-            self.state[hexes.load(loc)] = Token(colour, kind)
-
+            items.append((self.hexes.load(loc), Token(colour, kind)))
+        for hex, token in sorted(items, key=lambda item: self.hexes.depth(item[0])):
+            self.state[hex] = token
+
+    def to_bytes(self):
+        if len(self.state) > token_slots:
+            raise ValueError('too many tokens to save as bytes')
+        slots = [slot.pack(*self.hexes.to_tuple(hex), token_codes[self.state[hex]]) for hex in sorted(self.state, key=self.hexes.to_tuple)]
+        slots.extend(slot.pack(0, 0, 0, empty_slot) for _ in range(token_slots - len(slots)))
+        return bytes((colours.index(self.active_player),)) + b''.join(slots)
+
+    # Decoding replaces the whole position. The slots are grouped into stacks, which go into a new state in one go.
+    def from_bytes(self, data):
+        stacks = defaultdict(list)
+        for x, y, z, code in slot.iter_unpack(data[1:]):
+            if code == empty_slot:
+                break
+            stacks[x, y].append((z, tokens[code]))
+        columns = {}
+        for (x, y), stack in stacks.items():
+            if len(stack) > 1:
+                stack.sort()
+            if [z for z, token in stack] != list(range(1 - len(stack), 1)):
+                raise ValueError('gap in the stack at %d,%d' % (x, y))
+            columns[self.hexes.from_tuple((x, y, 0))] = [token for z, token in stack]
+        state = type(self.state)()
+        state.fill(columns)
+        self.state = state
+        self.active_player = colours[data[0]]
+        self.history = []
+
+    # Put a token on top of the stack at a hex.
     def add(self, token, hex):
-        if hex in self.state:
-            self.add(self.state[hex], hexes.add(hex, hexes.down))
-        self.state[hex] = token
+        self.state.push_top(hex, token)
 
+    # Take the token off the top of the stack at a hex.
     def remove(self, hex):
-        remove = self.state[hex]
-        if hexes.add(hex, hexes.down) in self.state:
-            self.state[hex] = self.remove(hexes.add(hex, hexes.down))
-        else:
-            del self.state[hex]
-        return remove
+        return self.state.pop_top(hex)
 
     @contextmanager
     def temporarily_remove(self, hex):
@@ -57,105 +372,130 @@ class Model(object):
 
     # Get the hexes on the top of the hive ie. not covered by another hex.
     def active_hexes(self):
-        return set(hex for hex in self.state.keys() if hexes.is_active(hex))
+        return set(self.state.active)
 
     # Get the occupied hexes which neighbour this one.
     def occupied_neighbours(self, hex):
-        return hexes.neighbours(hex) & self.active_hexes()
+        return self.hexes.neighbours(hex) & self.state.active
 
     # Get the unoccupied hexes which neighbour this one.
     def unoccupied_neighbours(self, hex):
-        return hexes.neighbours(hex) - self.active_hexes()
+        return self.hexes.neighbours(hex) - self.state.active
 
     # Get the unoccupied hexes which neighbour this one but no others
     def unique_unoccupied_neighbours(self, hex):
-        assert hex in self.state
+        assert hex in self.state.tops
         return set(neighbour for neighbour in self.unoccupied_neighbours(hex)
-            if len(self.occupied_neighbours(neighbour)) == 1)
+            if self.state.neighbour_counts[neighbour] == 1)
 
     def winner(self):
         for colour in colours:
-            colour_bee = self.colour_hexes(colour) & self.kind_hexes(bee)
-            if len(colour_bee) > 0:
-                active_hex = hexes.make_active(tuple(colour_bee)[0])
-                if len(self.occupied_neighbours(active_hex)) == 6:
+            colour_bee = self.state.bee_columns[colour]
+            if colour_bee is not None:
+                if self.state.neighbour_counts[colour_bee] == 6:
                     return self.colour_opposite(colour)
         return None
 
     # Find the hexes that can have tokens moved out of them without splitting the hive.
     # Imagine the board as a graph and use Tarjan's algorithm to find the hexes that are NOT cut vertices.
     # https://en.wikipedia.org/wiki/Biconnected_component
+    # The depth first search keeps its own stack so long, thin hives can't hit the recursion limit.
+    # A token on top of a stack can always move, as the hex below it stays behind.
+    @cached
     def move_sources(self):
-        active_hexes = list(self.active_hexes())
-
-        discovery = {hex:0 for hex in active_hexes}
-        low = {hex:9999 for hex in active_hexes}
-        visited = {hex:False for hex in active_hexes}
-        parent = {hex:None for hex in active_hexes}
-
-        cut_hexes = {hex:False for hex in active_hexes}
-
-        def depth_first_search(hex, depth=0):
-            visited[hex] = True
-            discovery[hex] = low[hex] = depth
-            child_count = 0
-            for neighbour in self.occupied_neighbours(hex):
-                if visited[neighbour] == False:
-                    child_count += 1
-                    parent[neighbour] = hex
-                    depth_first_search(neighbour, depth+1)
-                    low[hex] = min(low[hex], low[neighbour])
-                    if parent[hex] is None and child_count > 1:
-                        cut_hexes[hex] = True
-                    if parent[hex] is not None and low[neighbour] >= discovery[hex]:
-                        cut_hexes[hex] = True
-                elif parent[hex] != neighbour:
+        active_hexes = self.state.active
+        if len(active_hexes) == 0:
+            return frozenset()
+
+        root = next(iter(active_hexes))
+        discovery = {root: 0}
+        low = {root: 0}
+        root_children = 0
+        cut_hexes = set()
+
+        # Each stack entry is a hex, its parent, and an iterator over the neighbours still to visit.
+        stack = [(root, None, iter(self.occupied_neighbours(root)))]
+        while len(stack) > 0:
+            hex, parent, neighbours = stack[-1]
+            for neighbour in neighbours:
+                if neighbour not in discovery:
+                    discovery[neighbour] = low[neighbour] = len(discovery)
+                    stack.append((neighbour, hex, iter(self.occupied_neighbours(neighbour))))
+                    break
+                elif neighbour != parent:
                     low[hex] = min(low[hex], discovery[neighbour])
-
-        if len(active_hexes) > 0:
-            depth_first_search(active_hexes[0])
-        return set(hex for hex in cut_hexes if cut_hexes[hex] == False)
+            else:
+                # All the neighbours have been visited, so pass the low point back up to the parent.
+                stack.pop()
+                if parent == root:
+                    root_children += 1
+                elif parent is not None:
+                    low[parent] = min(low[parent], low[hex])
+                    if low[hex] >= discovery[parent]:
+                        cut_hexes.add(parent)
+
+        if root_children > 1:
+            cut_hexes.add(root)
+        return frozenset(hex for hex in active_hexes
+            if hex not in cut_hexes or self.state.height(hex) > 1)
 
     def crawl_moves(self, hex):
         crawl_moves = CrawlMoves(set(), set())
         occupied = self.occupied_neighbours(hex)
         unoccupied = self.unoccupied_neighbours(hex)
         for destination in unoccupied:
-            left_occupied = hexes.rotate(hexes.left, destination, hex) in occupied
-            right_occupied = hexes.rotate(hexes.right, destination, hex) in occupied
+            left_occupied = self.hexes.rotate(self.hexes.left, destination, hex) in occupied
+            right_occupied = self.hexes.rotate(self.hexes.right, destination, hex) in occupied
             if left_occupied and not right_occupied:
                 crawl_moves.left.add(destination)
             if right_occupied and not left_occupied:
                 crawl_moves.right.add(destination)
         return crawl_moves
 
+    # The crawl moves from every empty hex around the hive, worked out once per position and shared by every crawling token,
+    # so they are frozen.
+    @cached
+    def perimeter_graph(self):
+        perimeter = self.hexes.merge(self.unoccupied_neighbours(hex) for hex in self.state.active)
+        graph = {}
+        for hex in perimeter:
+            crawl_moves = self.crawl_moves(hex)
+            graph[hex] = CrawlMoves(frozenset(crawl_moves.left), frozenset(crawl_moves.right))
+        return graph
+
+    # The crawl moves around the hive for the token at this hex.
+    # Picking the token up only changes the crawl moves of the hexes around it,
+    # so only those are worked out again, and the rest come from the shared perimeter graph.
     def crawl_graph(self, crawl_hex):
+        perimeter = self.perimeter_graph()
+        with self.temporarily_remove(crawl_hex):
+            nearby = {hex: self.crawl_moves(hex) for hex in self.hexes.neighbours(crawl_hex) | {crawl_hex}
+                if hex not in self.state.active}
         graph = {}
-        crawl_moves = self.crawl_moves(crawl_hex)
+        crawl_moves = nearby[crawl_hex] if crawl_hex in nearby else self.crawl_moves(crawl_hex)
         open_set = crawl_moves.left|crawl_moves.right
-        with self.temporarily_remove(crawl_hex):
-            while len(open_set) > 0:
-                current = open_set.pop()
-                graph[current] = self.crawl_moves(current)
-                for hex in graph[current].left:
-                    if hex not in graph and hex not in open_set:
-                        open_set.add(hex)
+        while len(open_set) > 0:
+            current = open_set.pop()
+            graph[current] = nearby[current] if current in nearby else perimeter[current]
+            for hex in graph[current].left:
+                if hex not in graph and hex not in open_set:
+                    open_set.add(hex)
         return graph
 
     def bee_moves(self, hex):
-        return hexes.merge(self.crawl_moves(hex))
+        return self.hexes.merge(self.crawl_moves(hex))
 
     def spider_moves(self, hex):
         spider_moves = self.crawl_moves(hex)
         graph = self.crawl_graph(hex)
         for _ in range(2):
             spider_moves = CrawlMoves(
-                left=hexes.merge(graph[hex].left for hex in spider_moves.left),
-                right=hexes.merge(graph[hex].right for hex in spider_moves.right))
-        return hexes.merge(spider_moves)
+                left=self.hexes.merge(graph[hex].left for hex in spider_moves.left),
+                right=self.hexes.merge(graph[hex].right for hex in spider_moves.right))
+        return self.hexes.merge(spider_moves)
 
     def ant_moves(self, hex):
-        ant_moves = hexes.merge(self.crawl_moves(hex))
+        ant_moves = self.hexes.merge(self.crawl_moves(hex))
         open_set = self.crawl_moves(hex).left
         graph = self.crawl_graph(hex)
         while len(open_set) > 0:
@@ -168,19 +508,19 @@ class Model(object):
 
     def hopper_moves(self, hex):
         hopper_moves = set()
-        for offset in hexes.offsets:
-            destination = hexes.add(hex, offset)
-            if destination in self.state:
-                while destination in self.state:
-                    destination = hexes.add(destination, offset)
+        for offset in self.hexes.offsets:
+            destination = self.hexes.add(hex, offset)
+            if destination in self.state.tops:
+                while destination in self.state.tops:
+                    destination = self.hexes.add(destination, offset)
                 hopper_moves.add(destination)
         return hopper_moves
 
     def beetle_moves(self, hex):
-        if hexes.add(hex, hexes.down) in self.state:
-            return hexes.neighbours(hex)
+        if self.state.height(hex) > 1:
+            return self.hexes.neighbours(hex)
         else:
-            return hexes.merge(self.crawl_moves(hex)) | self.occupied_neighbours(hex)
+            return self.hexes.merge(self.crawl_moves(hex)) | self.occupied_neighbours(hex)
 
     move_lookup = {bee:    bee_moves,
                    spider: spider_moves,
@@ -188,11 +528,104 @@ class Model(object):
                    hopper: hopper_moves,
                    beetle: beetle_moves}
 
-    def colour_moves(self, colour):
+    # Get the hexes a colour can move a token out of. Nothing can move until the bee is placed.
+    def colour_sources(self, colour):
         if self.colour_bee_placed(colour):
-            return {source: self.move_lookup[self.state[source].kind](self,source) for source in self.move_sources() & self.colour_hexes(colour)}
+            return self.move_sources() & self.state.active_colours[colour]
+        else:
+            return frozenset()
+
+    def source_moves(self, source):
+        return self.move_lookup[self.state.tops[source].kind](self, source)
+
+    def colour_moves(self, colour):
+        return {source: self.source_moves(source) for source in self.colour_sources(colour)}
+
+    # Yield the legal moves for a colour one at a time, placements first, in a stable order.
+    # The destinations of each token are only worked out when the generator gets to it.
+    def generate_moves(self, colour):
+        places = sorted(self.colour_places(colour))
+        for kind in self.colour_hand(colour):
+            token = Token(colour, kind)
+            for destination in places:
+                yield Move(token, None, destination)
+        for source in sorted(self.colour_sources(colour)):
+            for destination in sorted(self.source_moves(source)):
+                yield Move(None, source, destination)
+
+    def count_moves(self, colour):
+        return (len(self.colour_hand(colour)) * len(self.colour_places(colour)) +
+                sum(len(self.source_moves(source)) for source in self.colour_sources(colour)))
+
+    # Every legal move for a colour, in the order generate_moves gives them.
+    # They are worked out once per position and shared, so a player choosing from them
+    # and a game checking the move it chose only pay for them once.
+    @cached
+    def legal_moves(self, colour):
+        return tuple(self.generate_moves(colour))
+
+    # The legal moves as a set, for checking whether a move is one of them.
+    @cached
+    def legal_move_set(self, colour):
+        return frozenset(self.legal_moves(colour))
+
+    # Whether a colour has any legal move, without listing them.
+    def has_moves(self, colour):
+        moves = self.cached_result('legal_moves', colour)
+        if moves is not None:
+            return len(moves) > 0
+        if len(self.colour_hand(colour)) > 0 and len(self.colour_places(colour)) > 0:
+            return True
+        return any(len(self.source_moves(source)) > 0 for source in self.colour_sources(colour))
+
+    # Whether a move, or a pass for None, is legal for a colour. A pass is only legal when there is nothing else to do.
+    # If the legal moves have already been listed for the position it looks the move up in them,
+    # otherwise it only works out where the token being played can go.
+    def is_legal(self, colour, move):
+        if self.cached_result('legal_moves', colour) is not None:
+            legal = self.legal_move_set(colour)
+            return len(legal) == 0 if move is None else move in legal
+        if move is None:
+            return not self.has_moves(colour)
+        elif move.token is not None and move.source is None:
+            return (
+                move.token.colour == colour and
+                move.token.kind in self.colour_hand(colour) and
+                move.destination in self.colour_places(colour))
+        elif move.token is None and move.source is not None:
+            return (
+                move.source in self.colour_sources(colour) and
+                move.destination in self.source_moves(move.source))
         else:
-            return {}
+            return False
+
+    # The result of a cached method for this position if something has already worked it out, otherwise None.
+    def cached_result(self, name, *args):
+        return self.cache.get((name, self.state.hash, args))
+
+    # Pick a legal move uniformly at random, or None if there isn't one, without listing them all.
+    # If the legal moves have already been listed it picks from those instead, which gives the same move for the same rng.
+    # `rng` is anything with a `randrange` method, such as the `random` module.
+    def random_move(self, colour, rng):
+        moves = self.cached_result('legal_moves', colour)
+        if moves is not None:
+            return moves[rng.randrange(len(moves))] if len(moves) > 0 else None
+        hand = self.colour_hand(colour)
+        places = self.colour_places(colour)
+        moves = self.colour_moves(colour)
+        place_count = len(hand) * len(places)
+        total = place_count + sum(len(destinations) for destinations in moves.values())
+        if total == 0:
+            return None
+        index = rng.randrange(total)
+        if index < place_count:
+            kind, destination = divmod(index, len(places))
+            return Move(Token(colour, hand[kind]), None, sorted(places)[destination])
+        index -= place_count
+        for source in sorted(moves):
+            if index < len(moves[source]):
+                return Move(None, source, sorted(moves[source])[index])
+            index -= len(moves[source])
 
     def moves(self):
         return {colour: self.colour_moves(colour) for colour in colours}
@@ -203,18 +636,19 @@ class Model(object):
 
     # Get the hexes occupied by tokens of a given colour.
     def colour_hexes(self, colour):
-        return set(hex for hex in self.state if self.state[hex].colour == colour)
+        return set(self.state.hex_at(*slot) for slot in self.state.colours[colour])
 
     # Get the hexes occupied by tokens of a given kind.
     def kind_hexes(self, *kinds):
-        return set(hex for hex in self.state if self.state[hex].kind in kinds)
+        return set(self.state.hex_at(*slot) for kind in kinds for slot in self.state.kinds[kind])
 
     # Get hexes neighbouring tokens of a given colour.
+    # Only tokens on top of the hive count, tokens buried under a beetle are hidden.
     def colour_neighbours(self, colour):
-        return hexes.merge(hexes.neighbours(hex) for hex in self.colour_hexes(colour))
+        return self.hexes.merge(self.hexes.neighbours(hex) for hex in self.state.active_colours[colour])
 
     def colour_bee_placed(self, colour):
-        return len(self.colour_hexes(colour) & self.kind_hexes(bee)) > 0
+        return self.state.bee_columns[colour] is not None
 
     # Find the hexes that are valid for a new token of a given colour.
     # Conditions:
@@ -226,17 +660,17 @@ class Model(object):
     #   the second token can touch the first, regardless of colour
     def colour_places(self, colour):
         if len(self.state) == 0:
-            return set([hexes.centre,])
+            return set([self.hexes.centre,])
         elif len(self.state) == 1:
-            return hexes.neighbours(hexes.centre)
+            return self.hexes.neighbours(self.hexes.centre)
         else:
-            return self.colour_neighbours(colour) - self.colour_neighbours(self.colour_opposite(colour)) - set(self.state)
+            return self.colour_neighbours(colour) - self.colour_neighbours(self.colour_opposite(colour)) - self.state.active
 
     def places(self):
         return {colour: self.colour_places(colour) for colour in colours}
 
     def colour_hand(self, colour):
-        if len(self.colour_hexes(colour)) >= 3 and not self.colour_bee_placed(colour):
+        if self.state.placed[colour] >= 3 and not self.colour_bee_placed(colour):
             return [bee]
         else:
-            return [kind for kind in kinds if len(self.colour_hexes(colour) & self.kind_hexes(kind)) < starting_hand[kind]]
+            return [kind for kind in kinds if self.state.counts[Token(colour, kind)] < starting_hand[kind]]
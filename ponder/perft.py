@@ -0,0 +1,84 @@
+# Perft: count the positions reached after every sequence of legal moves to a given depth.
+# Counting the same tree with a different move generator proves it generates the same moves,
+# and timing it gives a benchmark for move generation.
+#
+# A pass counts as one move when there are no others, and a finished game is a leaf at any depth.
+
+import argparse
+import sys
+import time
+
+from ponder import hexids, model, selfplay
+
+# Models on hex ids give their moves as ids, which game records can't hold, so they can only be counted here.
+model_types = {**selfplay.model_types, 'ids': hexids.Model}
+
+# Named positions in Model.save form, with the side to move and the expected counts at each depth from 1.
+positions = {
+    'start': ('', model.black, (5, 150, 2220, 32856)),
+    'opening': (
+        '-2,-1,0:white:Bee|-2,0,0:white:spider|-1,0,0:white:beetle|0,0,0:black:hopper|1,-1,0:black:spider|'
+        '2,-1,0:black:spider',
+        model.black, (7, 210, 6093, 220243)),
+    'early': (
+        '-2,-1,0:white:hopper|-2,0,0:white:beetle|-2,1,0:white:spider|-1,-3,0:black:beetle|-1,-2,0:black:ant|'
+        '-1,0,0:white:ant|0,-1,0:white:Bee|0,0,0:black:Bee|0,1,0:black:hopper|1,1,0:black:spider|2,1,0:white:ant',
+        model.black, (31, 1838, 74236)),
+    'midgame': (
+        '-2,-3,0:black:hopper|-2,-2,0:black:ant|-1,-2,0:white:beetle|-1,0,0:white:ant|-1,1,0:black:hopper|'
+        '0,-2,0:white:spider|0,-1,0:white:hopper|0,0,0:black:spider|0,1,0:black:beetle|1,-3,0:white:beetle|'
+        '1,-2,0:white:hopper|2,-2,0:white:Bee|2,-1,0:white:spider|2,0,0:black:Bee|2,1,0:white:hopper|'
+        '3,1,0:black:beetle|3,2,0:black:spider|3,3,0:black:hopper|4,3,0:black:ant',
+        model.black, (56, 2516, 146271)),
+    'stacked': (
+        '-6,3,0:black:hopper|-5,2,0:black:spider|-4,-1,-1:white:ant|-4,-1,0:black:beetle|-4,1,0:white:ant|'
+        '-4,3,0:black:spider|-3,-1,0:black:hopper|-3,0,0:black:ant|-3,1,0:black:ant|-3,2,0:black:beetle|'
+        '-2,1,0:black:hopper|-1,0,0:black:Bee|0,-2,0:black:ant|0,-1,0:white:ant|1,-1,0:white:Bee|'
+        '2,-2,0:white:spider|2,-1,0:white:hopper|3,-4,0:white:spider|3,-3,0:white:hopper|3,-1,0:white:beetle|'
+        '4,-5,0:white:hopper|4,-2,0:white:beetle',
+        model.black, (45, 373, 14720)),
+}
+
+def perft(m, depth):
+    if depth == 0 or m.winner() is not None:
+        return 1
+    moves = list(m.generate_moves(m.active_player)) or [None]
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        m.push(move)
+        nodes += perft(m, depth-1)
+        m.pop()
+    return nodes
+
+def load(name, model_type=model.Model):
+    state, player, _ = positions[name]
+    m = model_type()
+    m.load(state)
+    m.active_player = player
+    return m
+
+def expected(name, depth):
+    counts = positions[name][2]
+    return counts[depth-1] if depth <= len(counts) else None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count and time the legal move trees from the named positions.')
+    parser.add_argument('names', nargs='*', default=sorted(positions), help='positions to run, defaults to all of them')
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--model', choices=sorted(model_types), default='dict')
+    args = parser.parse_args()
+
+    failed = False
+    for name in args.names:
+        for depth in range(1, args.depth+1):
+            m = load(name, model_types[args.model])
+            start = time.perf_counter()
+            nodes = perft(m, depth)
+            elapsed = time.perf_counter() - start
+            target = expected(name, depth)
+            status = 'unchecked' if target is None else 'ok' if nodes == target else 'FAILED, expected %d' % target
+            failed = failed or status.startswith('FAILED')
+            print('%-8s depth %d: %9d nodes in %7.3fs, %8.0f nodes/s, %s' % (name, depth, nodes, elapsed, nodes / elapsed, status))
+    sys.exit(1 if failed else 0)
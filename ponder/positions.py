@@ -0,0 +1,169 @@
+# Immutable positions, for keeping many positions from one game alive at once, as a search tree does.
+#
+# A position keeps its own board, as a stack of tokens for each column of the hive, and shares it with the positions
+# it came from wherever it is the same. The stacks are tuples, split between a fixed number of buckets by the column's hash,
+# and playing a move copies only the bucket of each column the move touches, one or two small dicts, and the
+# stacks in them that change. Everything else is the same objects as in the parent, however many positions branch off it.
+# Positions also keep the hash of their board, worked out a token at a time as the State does.
+#
+# Questions about a position are answered by a model of the same type, one for each thread, moved to the position
+# by popping and pushing only the stacks that differ from the position it was at before. Buckets that are the same
+# object can't differ, so this costs no more than the tokens on the board however far apart the positions are in the tree,
+# and positions asked about one after another are usually close. Answers are cached by the model's hash as usual.
+# Moves are checked when they are played, so a position is always one the model can get to.
+
+import threading
+
+from ponder import model
+
+bucket_count = 16
+
+# A model of each type for each thread, and the position it is at.
+scratch = threading.local()
+
+class Position(object):
+    __slots__ = ('model_type', 'buckets', 'state_hash', 'parent', 'move', 'plies', 'active_player')
+
+    def __init__(self, model_type, buckets, state_hash, parent, move, plies, active_player):
+        for name, value in zip(self.__slots__, (model_type, buckets, state_hash, parent, move, plies, active_player)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('positions are immutable')
+
+    # The position a model is in, without its history, as the root of new positions.
+    # The stacks are copied, so the model can carry on being used.
+    @classmethod
+    def start(cls, m):
+        buckets = tuple({} for _ in range(bucket_count))
+        for column, stack in m.state.columns.items():
+            buckets[hash(column) % bucket_count][column] = tuple(stack)
+        return cls(type(m), buckets, m.state.hash, None, None, 0, m.active_player)
+
+    # The position after a move for the side to move, or a pass for None.
+    # Raises ValueError if the move isn't legal, as Game.make_move does.
+    def play(self, move):
+        m = self.sync()
+        if not m.is_legal(self.active_player, move):
+            raise ValueError('illegal move')
+        buckets = self.buckets
+        state_hash = self.state_hash
+        if move is not None:
+            buckets = list(buckets)
+            copied = set()
+            def stack_at(column):
+                index = hash(column) % bucket_count
+                if index not in copied:
+                    buckets[index] = dict(buckets[index])
+                    copied.add(index)
+                return buckets[index], buckets[index].get(column, ())
+            token = move.token
+            if move.source is not None:
+                bucket, stack = stack_at(move.source)
+                token = stack[-1]
+                state_hash ^= model.zobrist_key(move.source, len(stack) - 1, token)
+                if len(stack) > 1:
+                    bucket[move.source] = stack[:-1]
+                else:
+                    del bucket[move.source]
+            bucket, stack = stack_at(move.destination)
+            state_hash ^= model.zobrist_key(move.destination, len(stack), token)
+            bucket[move.destination] = stack + (token,)
+            buckets = tuple(buckets)
+        return Position(self.model_type, buckets, state_hash, self, move, self.plies + 1,
+                        m.colour_opposite(self.active_player))
+
+    # The moves from the start to here.
+    @property
+    def history(self):
+        moves = []
+        position = self
+        while position.parent is not None:
+            moves.append(position.move)
+            position = position.parent
+        moves.reverse()
+        return moves
+
+    # This thread's model, moved to this position.
+    # Every stack that differs is popped down to what the two have in common, then the rest of the new stack pushed,
+    # with all the pops done before any pushes so the hive is never bigger than either position.
+    def sync(self):
+        models = getattr(scratch, 'models', None)
+        if models is None:
+            models = scratch.models = {}
+        if self.model_type not in models:
+            models[self.model_type] = (self.model_type(), None)
+        m, current = models[self.model_type]
+        if current is self:
+            return m
+        # If something goes wrong part way, the model is thrown away rather than left between positions.
+        del models[self.model_type]
+        state = m.state
+        pushes = []
+        for index, bucket in enumerate(self.buckets):
+            old = {} if current is None else current.buckets[index]
+            if old is bucket:
+                continue
+            for column in set(old) | set(bucket):
+                old_stack = old.get(column, ())
+                new_stack = bucket.get(column, ())
+                if old_stack is new_stack:
+                    continue
+                common = 0
+                while common < min(len(old_stack), len(new_stack)) and old_stack[common] == new_stack[common]:
+                    common += 1
+                for _ in range(len(old_stack) - common):
+                    state.pop_top(column)
+                pushes.extend((column, token) for token in new_stack[common:])
+        for column, token in pushes:
+            state.push_top(column, token)
+        m.active_player = self.active_player
+        models[self.model_type] = (m, self)
+        return m
+
+    # Ask this thread's model something about this position.
+    def ask(self, name, *args):
+        return getattr(self.sync(), name)(*args)
+
+    # The same hash as a model in this position.
+    @property
+    def hash(self):
+        if self.active_player == model.white:
+            return self.state_hash ^ model.white_to_move
+        return self.state_hash
+
+    def canonical_hash(self):
+        return self.ask('canonical_hash')
+
+    def winner(self):
+        return self.ask('winner')
+
+    def colour_places(self, colour):
+        return self.ask('colour_places', colour)
+
+    def colour_hand(self, colour):
+        return self.ask('colour_hand', colour)
+
+    def colour_sources(self, colour):
+        return self.ask('colour_sources', colour)
+
+    def colour_moves(self, colour):
+        return self.ask('colour_moves', colour)
+
+    def count_moves(self, colour):
+        return self.ask('count_moves', colour)
+
+    def legal_moves(self, colour):
+        return self.ask('legal_moves', colour)
+
+    def legal_move_set(self, colour):
+        return self.ask('legal_move_set', colour)
+
+    def random_move(self, colour, rng):
+        return self.ask('random_move', colour, rng)
+
+    def save(self):
+        return self.ask('save')
+
+    def to_bytes(self):
+        return self.ask('to_bytes')
@@ -0,0 +1,64 @@
+# Opt-in counters for the model's move generation: how many times each function is called and how long it takes,
+# both by function and by the kind of token whose moves are being worked out.
+#
+# A Profiler swaps timed wrappers in as attributes of one model instance, and takes them out again when disabled,
+# so a model that is not being profiled runs the plain class methods and pays nothing at all.
+# Times include the functions called inside, so crawl_graph time is also part of ant_moves time.
+
+import time
+from collections import defaultdict
+
+# The model methods that are timed, where the model has them.
+functions = ('winner', 'move_sources', 'colour_sources', 'colour_places', 'colour_hand', 'source_moves',
+             'perimeter_graph', 'crawl_graph', 'crawl_moves', 'crawl_masks', 'count_moves', 'legal_moves', 'random_move')
+
+class Profiler(object):
+    def __init__(self, m):
+        self.model = m
+        self.functions = defaultdict(lambda: [0, 0.0])
+        self.kinds = defaultdict(lambda: [0, 0.0])
+        self.enabled = []
+
+    def timed(self, function, *counters):
+        def timed_function(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                for counter in counters:
+                    counter[0] += 1
+                    counter[1] += elapsed
+        return timed_function
+
+    def enable(self):
+        if len(self.enabled) > 0:
+            return self
+        for name in functions:
+            if hasattr(self.model, name):
+                setattr(self.model, name, self.timed(getattr(self.model, name), self.functions[name]))
+                self.enabled.append(name)
+        # The moves for each kind are looked up in a table of plain functions, so the table is swapped too.
+        self.model.move_lookup = {kind: self.timed(function, self.functions[function.__name__], self.kinds[kind])
+            for kind, function in type(self.model).move_lookup.items()}
+        self.enabled.append('move_lookup')
+        return self
+
+    def disable(self):
+        for name in self.enabled:
+            delattr(self.model, name)
+        self.enabled = []
+
+    # The counts so far, as {'functions': {name: (calls, seconds)}, 'kinds': {kind: (calls, seconds)}},
+    # leaving out anything that was never called.
+    def report(self):
+        return {'functions': {name: tuple(counter) for name, counter in self.functions.items() if counter[0] > 0},
+                'kinds': {kind: tuple(counter) for kind, counter in self.kinds.items() if counter[0] > 0}}
+
+# A report as a table, slowest first.
+def format_report(report):
+    lines = []
+    for section in ('functions', 'kinds'):
+        for name, (calls, seconds) in sorted(report[section].items(), key=lambda item: -item[1][1]):
+            lines.append('%-16s %9d calls %9.3fs %8.1fus/call' % (name, calls, seconds, 1e6 * seconds / calls))
+    return '\n'.join(lines)
@@ -0,0 +1,59 @@
+# Game records.
+# A game is saved on one line as its result followed by its moves, separated by '|'.
+# The result is the winning colour or 'draw'.
+# A placement is saved as 'colour:kind:destination', a movement as 'source:destination' and a pass as 'pass',
+# with hexes in the same form as Model.save.
+# Record files hold one game per line, and may be gzipped if their names end in '.gz'.
+
+import gzip
+
+from ponder import hexes
+from ponder.tuples import Move, Token
+
+draw = 'draw'
+no_move = 'pass'
+
+def save_move(move):
+    if move is None:
+        return no_move
+    elif move.source is None:
+        return ':'.join((*move.token, hexes.save(move.destination)))
+    else:
+        return ':'.join((hexes.save(move.source), hexes.save(move.destination)))
+
+def load_move(string):
+    if string == no_move:
+        return None
+    items = string.split(':')
+    if len(items) == 3:
+        colour, kind, destination = items
+        return Move(Token(colour, kind), None, hexes.load(destination))
+    else:
+        source, destination = items
+        return Move(None, hexes.load(source), hexes.load(destination))
+
+def save_game(winner, moves):
+    return '|'.join((winner or draw, *(save_move(move) for move in moves)))
+
+def load_game(string):
+    result, *moves = string.strip().split('|')
+    return (None if result == draw else result), [load_move(move) for move in moves]
+
+def open_records(path):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path)
+
+# Yield the lines of a record file one at a time, with their line numbers, skipping blank lines.
+# Only one line is in memory at once, so files of any size can be streamed.
+def read_lines(path):
+    with open_records(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if len(line) > 0:
+                yield number, line
+
+# Yield the games in a record file one at a time, as (winner, moves).
+def read_games(path):
+    for _, line in read_lines(path):
+        yield load_game(line)
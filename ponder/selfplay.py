@@ -0,0 +1,73 @@
+# Self play: play many games between a pair of AI players over a pool of processes,
+# writing each game to a records file as soon as it finishes.
+
+import argparse
+import functools
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from ponder import ai, game, model, records, bitboard
+
+# Play one game in a worker process and return its record.
+# Players are given as callables that make a new player, so that they can be sent to the workers.
+def play_game(black_player, white_player, model_type, max_plies, seed):
+    random.seed(seed)
+    g = game.Game(model_type(), {model.black: black_player(), model.white: white_player()}, trusted=True)
+    winner = g.play(max_plies)
+    return records.save_game(winner, g.model.history), len(g.model.history)
+
+# Play `games` games and append their records to the file at `path`, in the order they finish.
+# Returns the number of games and plies played and the time taken.
+def run(black_player, white_player, games, path, workers=None, model_type=model.Model, max_plies=None, seed=None,
+        report_every=100, out=sys.stderr):
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(64) for _ in range(games)]
+    play = functools.partial(play_game, black_player, white_player, model_type, max_plies)
+    plies = 0
+    start = time.perf_counter()
+    with Pool(workers) as pool, open(path, 'a') as f:
+        for played, (record, length) in enumerate(pool.imap_unordered(play, seeds), 1):
+            f.write(record + '\n')
+            f.flush()
+            plies += length
+            if report_every and played % report_every == 0:
+                report(played, plies, time.perf_counter() - start, out)
+    elapsed = time.perf_counter() - start
+    if report_every:
+        report(games, plies, elapsed, out)
+    return games, plies, elapsed
+
+def report(games, plies, elapsed, out):
+    print('%d games, %d plies in %.1fs: %.2f games/s, %.1f plies/s' % (
+        games, plies, elapsed, games / elapsed, plies / elapsed), file=out)
+
+# Players by name, for the command line. 'mcts' takes its iterations after a colon, eg. 'mcts:200'.
+def make_player(name):
+    kind, _, iterations = name.partition(':')
+    if kind == 'random':
+        return ai.AI
+    elif kind == 'rollout':
+        return ai.RolloutPolicy
+    elif kind == 'mcts':
+        return functools.partial(ai.MCTSAI, iterations=int(iterations or 1000))
+    else:
+        raise ValueError(name)
+
+model_types = {'dict': model.Model, 'bitboard': bitboard.Model}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play games between two AI players and save their records.')
+    parser.add_argument('path', help='file to append game records to')
+    parser.add_argument('--black', default='random', help="black's player: 'random', 'rollout' or 'mcts:ITERATIONS'")
+    parser.add_argument('--white', default='random', help="white's player: 'random', 'rollout' or 'mcts:ITERATIONS'")
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, defaults to the number of CPUs')
+    parser.add_argument('--model', choices=sorted(model_types), default='dict')
+    parser.add_argument('--max-plies', type=int, default=None, help='call the game a draw after this many moves')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    run(make_player(args.black), make_player(args.white), args.games, args.path, args.workers,
+        model_types[args.model], args.max_plies, args.seed)
@@ -0,0 +1,207 @@
+# A game server: many games at once over a line protocol on a TCP or Unix socket, for people and bots alike.
+#
+# Every request is one line, a command and its arguments separated by spaces, and gets one line back,
+# 'OK' followed by the results, or 'ERROR' and a message. Moves are in the same form as game records.
+#
+#   NEW black white      start a game, each player being 'human' or an AI player as for selfplay, eg. 'mcts:200'.
+#                        Answers 'OK game', once any AI moves at the start have been played.
+#   MOVE game move       play a move for the human to move, then any AI replies. Answers 'OK game'.
+#   STATE game           answers 'OK game status moves', where the status is the colour to move, or once the game
+#                        is over 'black-wins', 'white-wins' or 'draw', and the moves so far are joined by '|'.
+#   MOVES game           answers 'OK game moves' with the legal moves for the side to move, joined by '|'.
+#   END game             forget a game. Answers 'OK game'.
+#   QUIT                 close the connection.
+#
+# Games are kept in memory, so thousands of them cost very little while they are waiting for people to move.
+# Each game's model only keeps cached results for the position it is in, which is all it will be asked about again.
+# Finished games are forgotten once nobody has asked about them for a while, so the result can still be fetched,
+# and so are games left waiting longer than that, when a new game is started.
+# AI moves are worked out in a pool of processes from the binary form of the position, so the event loop never waits
+# on them and other games carry on meanwhile.
+
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ponder import game, model, records, selfplay
+
+human = 'human'
+
+# Work out an AI player's move in a worker process.
+def ai_move(player, model_type, data, seed):
+    random.seed(seed)
+    m = model_type()
+    m.from_bytes(data)
+    return selfplay.make_player(player)().choose_move(m, m.active_player)
+
+# A game being played on the server, with the name of each colour's player.
+class Session(object):
+    def __init__(self, model_type, players, max_plies):
+        self.game = game.Game(model_type(), {})
+        self.players = players
+        self.max_plies = max_plies
+        self.lock = asyncio.Lock()
+        self.touched = time.monotonic()
+
+    # Play a move, and drop what the model cached about the positions before it.
+    def play(self, move):
+        self.game.make_move(move)
+        self.game.model.cache.clear()
+
+    def over(self):
+        return self.game.model.winner() is not None or (
+            self.max_plies is not None and len(self.game.model.history) >= self.max_plies)
+
+    def status(self):
+        if not self.over():
+            return self.game.active_player
+        winner = self.game.model.winner()
+        return records.draw if winner is None else winner + '-wins'
+
+# Games are draws after `max_plies` moves. AI moves run on `executor`, or a new pool of `workers` processes.
+# Finished games are forgotten `linger` seconds after they were last asked about, and unfinished ones after `idle` seconds.
+# The pool's processes are spawned rather than forked, as forked ones would hold copies of the open connections
+# and keep them from ever closing.
+class Server(object):
+    def __init__(self, model_type=model.Model, max_plies=200, executor=None, workers=None, linger=300, idle=3600):
+        self.model_type = model_type
+        self.max_plies = max_plies
+        self.linger = linger
+        self.idle = idle
+        self.executor = executor or ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.rng = random.Random()
+
+    def session(self, id):
+        if id not in self.sessions:
+            raise ValueError('no game ' + id)
+        session = self.sessions[id]
+        session.touched = time.monotonic()
+        return session
+
+    # Forget finished and idle games, other than any with moves being worked out.
+    def expire(self):
+        now = time.monotonic()
+        for id, session in list(self.sessions.items()):
+            timeout = self.linger if session.over() else self.idle
+            if now - session.touched >= timeout and not session.lock.locked():
+                del self.sessions[id]
+
+    # Play AI moves until it is a human's turn or the game is over.
+    async def advance(self, session):
+        loop = asyncio.get_running_loop()
+        while not session.over() and session.players[session.game.active_player] != human:
+            move = await loop.run_in_executor(self.executor, ai_move, session.players[session.game.active_player],
+                self.model_type, session.game.model.to_bytes(), self.rng.getrandbits(64))
+            session.play(move)
+
+    async def new(self, black, white):
+        for player in (black, white):
+            if player != human:
+                selfplay.make_player(player)
+        self.expire()
+        id = str(next(self.ids))
+        session = Session(self.model_type, {model.black: black, model.white: white}, self.max_plies)
+        # The game is only kept once its opening AI moves have been played,
+        # as if they fail the client never hears the id to end it with.
+        async with session.lock:
+            await self.advance(session)
+        self.sessions[id] = session
+        return id
+
+    async def move(self, id, move):
+        session = self.session(id)
+        async with session.lock:
+            if session.over():
+                raise ValueError('game over')
+            if session.players[session.game.active_player] != human:
+                raise ValueError('not your turn')
+            try:
+                session.play(records.load_move(move))
+            except ValueError:
+                raise ValueError('illegal move ' + move)
+            await self.advance(session)
+        return id
+
+    async def state(self, id):
+        session = self.session(id)
+        return ' '.join((id, session.status(), '|'.join(records.save_move(move) for move in session.game.model.history)))
+
+    async def moves(self, id):
+        session = self.session(id)
+        m = session.game.model
+        moves = [] if session.over() else list(m.legal_moves(m.active_player)) or [None]
+        return ' '.join((id, '|'.join(records.save_move(move) for move in moves)))
+
+    async def end(self, id):
+        session = self.session(id)
+        if session.lock.locked():
+            raise ValueError('moves being played in ' + id)
+        del self.sessions[id]
+        return id
+
+    # Each command's method and how many arguments it takes.
+    commands = {'NEW': (new, 2), 'MOVE': (move, 2), 'STATE': (state, 1), 'MOVES': (moves, 1), 'END': (end, 1)}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if len(line) == 0:
+                    break
+                try:
+                    try:
+                        command, *args = line.decode().split() or ['']
+                    except UnicodeDecodeError:
+                        raise ValueError('not UTF-8')
+                    if command == 'QUIT':
+                        break
+                    if command not in self.commands:
+                        raise ValueError('unknown command ' + command)
+                    method, arguments = self.commands[command]
+                    if len(args) != arguments:
+                        raise ValueError('%s takes %d arguments' % (command, arguments))
+                    reply = 'OK ' + await method(self, *args)
+                except ValueError as error:
+                    reply = 'ERROR ' + str(error)
+                writer.write((reply + '\n').encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    # Listen on a Unix socket at `path`, or on TCP at `host` and `port`.
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        self.executor.shutdown()
+
+async def serve(server, host, port, path):
+    listener = await server.start(host, port, path)
+    async with listener:
+        await listener.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Host games over a line protocol.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7878)
+    parser.add_argument('--unix', default=None, help='listen on a Unix socket at this path instead of TCP')
+    parser.add_argument('--workers', type=int, default=None, help='processes for AI moves, defaults to the number of CPUs')
+    parser.add_argument('--model', choices=sorted(selfplay.model_types), default='dict')
+    parser.add_argument('--max-plies', type=int, default=200, help='call a game a draw after this many moves')
+    parser.add_argument('--linger', type=float, default=300, help='seconds to keep a finished game after it was last asked about')
+    parser.add_argument('--idle', type=float, default=3600, help='seconds to keep an unfinished game nobody is playing')
+    args = parser.parse_args()
+
+    server = Server(selfplay.model_types[args.model], args.max_plies, workers=args.workers, linger=args.linger, idle=args.idle)
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    finally:
+        server.close()
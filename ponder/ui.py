@@ -105,5 +105,10 @@ if __name__ == '__main__':
 
     from ponder import ai, game, model
 
-    winner = game.Game(model.Model(), {black:UI(), white:ai.AI()}).play()
+    # The AI ponders while waiting for the player to type their move.
+    opponent = ai.MCTSAI(seconds=5, ponder=True)
+    try:
+        winner = game.Game(model.Model(), {black:UI(), white:opponent}).play()
+    finally:
+        opponent.close()
     print(winner, "won!")
\ No newline at end of file
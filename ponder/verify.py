@@ -0,0 +1,93 @@
+# Verify archives of game records: replay every game and check each move is legal and the result is right.
+#
+# Record files are streamed a line at a time and the games are replayed over a pool of processes,
+# in batches so that the workers aren't waiting on the pipe, with only a few batches in flight at once
+# so that memory stays flat however big the files are. Problems are reported with the file, line and ply.
+
+import argparse
+import collections
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ponder import game, model, records
+from ponder.selfplay import model_types
+
+# Replay one game from its record line.
+# Returns the number of plies and None, or the ply (counting from 1) and a description of the first thing wrong,
+# with ply 0 for a bad result and the number of plies plus one for a result that doesn't match the final position.
+def verify_game(line, model_type=model.Model):
+    result, *moves = line.split('|')
+    if result not in model.colours and result != records.draw:
+        return 0, 'unknown result %r' % result
+    g = game.Game(model_type(), {})
+    for ply, text in enumerate(moves, 1):
+        if g.model.winner() is not None:
+            return ply, 'move %s after the game was won' % text
+        try:
+            move = records.load_move(text)
+        except ValueError:
+            return ply, 'unreadable move %r' % text
+        if not g.is_legal(move):
+            return ply, 'illegal move %s' % text
+        g.model.push(move)
+    winner = g.model.winner()
+    if winner != (None if result == records.draw else result):
+        return len(moves) + 1, 'result %s but the winner is %s' % (result, winner or 'nobody')
+    return len(moves), None
+
+# Verify a batch of (line number, line) in a worker, returning the plies replayed and a list of (line number, ply, problem).
+def verify_batch(batch, model_type=model.Model):
+    plies = 0
+    problems = []
+    for number, line in batch:
+        ply, problem = verify_game(line, model_type)
+        if problem is None:
+            plies += ply
+        else:
+            plies += max(ply - 1, 0)
+            problems.append((number, ply, problem))
+    return plies, problems
+
+# Verify every game in the record files, yielding (path, line number, ply, problem) for each bad game as it is found.
+# `stats` is filled in with the number of games and plies replayed.
+def verify(paths, workers=None, model_type=model.Model, batch_size=200, stats=None):
+    stats = stats if stats is not None else {}
+    stats.update(games=0, plies=0)
+    workers = workers or os.cpu_count()
+    window = workers * 2
+    with ProcessPoolExecutor(workers) as pool:
+        for path in paths:
+            lines = records.read_lines(path)
+            batches = iter(lambda: list(itertools.islice(lines, batch_size)), [])
+            pending = collections.deque()
+            for batch in itertools.chain(batches, [None]):
+                if batch is not None:
+                    stats['games'] += len(batch)
+                    pending.append(pool.submit(verify_batch, batch, model_type))
+                while len(pending) > 0 and (batch is None or len(pending) >= window):
+                    plies, problems = pending.popleft().result()
+                    stats['plies'] += plies
+                    for number, ply, problem in problems:
+                        yield path, number, ply, problem
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay game records and report illegal moves and wrong results.')
+    parser.add_argument('paths', nargs='+', help='game record files, gzipped if they end in .gz')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, defaults to the number of CPUs')
+    parser.add_argument('--model', choices=sorted(model_types), default='bitboard')
+    parser.add_argument('--batch-size', type=int, default=200, help='games sent to a worker at a time')
+    args = parser.parse_args()
+
+    stats = {}
+    failed = 0
+    start = time.perf_counter()
+    for path, number, ply, problem in verify(args.paths, args.workers, model_types[args.model], args.batch_size, stats):
+        print('%s:%d: ply %d: %s' % (path, number, ply, problem))
+        failed += 1
+    elapsed = time.perf_counter() - start
+    print('%d games, %d plies in %.1fs: %.0f plies/s, %d bad games' % (
+        stats['games'], stats['plies'], elapsed, stats['plies'] / elapsed, failed), file=sys.stderr)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,17 @@
+from ponder import model, bitboard, hexids
+import pytest
+
+# The models that take and give hexes as 3-tuples, and every model.
+tuple_models = {'dict': model.Model, 'bitboard': bitboard.Model}
+models = {**tuple_models, 'ids': hexids.Model}
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'perft: count move generation trees from the perft positions')
+
+@pytest.fixture(params=list(models.values()), ids=list(models))
+def model_type(request):
+    return request.param
+
+@pytest.fixture(params=list(tuple_models.values()), ids=list(tuple_models))
+def tuple_model_type(request):
+    return request.param
@@ -0,0 +1,144 @@
+from ponder import ai, model, hexes
+from ponder.tuples import Token
+import random
+import time
+import pytest
+
+@pytest.fixture(autouse=True)
+def m():
+    m = model.Model()
+    yield m
+
+# Black's bee at the centre is surrounded apart from one gap, and white's ant can crawl into it.
+def set_winning_state(m):
+    m.add(Token(model.black, model.bee), hexes.centre)
+    for offset, kind in zip(hexes.offsets[:5], (model.bee, model.hopper, model.hopper, model.spider, model.spider)):
+        m.add(Token(model.white, kind), offset)
+    m.add(Token(model.white, model.ant), hexes.mul(hexes.offsets[0], 2))
+    m.active_player = model.white
+
+def test_ai_move(m):
+    move = ai.AI().choose_move(m, m.active_player)
+    assert move in m.generate_moves(m.active_player)
+
+def test_mcts_move(m):
+    player = ai.MCTSAI(iterations=20, rollout_depth=10, rng=random.Random(0))
+    start = m.save()
+    move = player.choose_move(m, m.active_player)
+    assert move in m.generate_moves(m.active_player)
+    assert m.save() == start
+    assert player.playouts == 20
+    assert player.playouts_per_second() > 0
+
+def test_mcts_finds_win(m):
+    set_winning_state(m)
+    start = m.hash
+    player = ai.MCTSAI(iterations=300, rollout_depth=10, rng=random.Random(0))
+    move = player.choose_move(m, model.white)
+    assert move.destination == hexes.offsets[5]
+    assert m.hash == start
+
+def test_mcts_time_budget(m):
+    player = ai.MCTSAI(seconds=0.05, rollout_depth=10)
+    player.choose_move(m, m.active_player)
+    assert player.playouts > 0
+    assert 0.05 <= player.elapsed < 1
+
+def test_parallel_mcts_finds_win(m):
+    set_winning_state(m)
+    player = ai.ParallelMCTSAI(workers=2, iterations=300, rollout_depth=10, rng=random.Random(0))
+    try:
+        move = player.choose_move(m, model.white)
+    finally:
+        player.close()
+    assert move.destination == hexes.offsets[5]
+    assert player.playouts == 600
+
+def test_parallel_mcts_options():
+    for option in ('reuse_tree', 'ponder'):
+        with pytest.raises(ValueError):
+            ai.ParallelMCTSAI(workers=1, **{option: True})
+    player = ai.ParallelMCTSAI(workers=1, reuse_tree=False, ponder=False)
+    assert not player.reuse_tree and not player.ponder
+
+def test_rollout_policy(m):
+    policy = ai.RolloutPolicy(rng=random.Random(0))
+    set_winning_state(m)
+    moves = set(m.generate_moves(model.white))
+    seen = set(policy.choose_move(m, model.white) for _ in range(500))
+    assert seen <= moves
+    assert len(seen) > len(moves) // 2
+
+def test_rollout_policy_weights(m):
+    set_winning_state(m)
+    policy = ai.RolloutPolicy(place_weight=0, kind_weights={model.ant: 1, model.hopper: 0, model.spider: 0, model.bee: 0},
+        rng=random.Random(0))
+    for _ in range(50):
+        assert policy.choose_move(m, model.white).source == hexes.mul(hexes.offsets[0], 2)
+
+def test_rollout_policy_moving_skips_places(m, monkeypatch):
+    set_winning_state(m)
+    def colour_places(colour):
+        raise AssertionError('places worked out for a move')
+    monkeypatch.setattr(m, 'colour_places', colour_places)
+    policy = ai.RolloutPolicy(place_weight=0, rng=random.Random(0))
+    assert all(policy.choose_move(m, model.white).source is not None for _ in range(20))
+
+def test_rollout_policy_none(m):
+    m.add(Token(model.black, model.bee), hexes.centre)
+    m.add(Token(model.black, model.bee), hexes.offsets[0])
+    assert ai.RolloutPolicy().choose_move(m, model.white) is None
+
+def test_mcts_ponder(m):
+    player = ai.MCTSAI(iterations=50, rollout_depth=10, rng=random.Random(0), ponder=True)
+    try:
+        m.push(player.choose_move(m, model.black))
+        time.sleep(0.2)
+        player.stop_pondering()
+        assert player.pondered > 0
+        root, scratch = player.tree
+        assert scratch.hash == m.hash
+        reply = max(root.children, key=lambda child: child.visits)
+        visits = reply.visits
+        m.push(reply.move)
+        move = player.choose_move(m, model.black)
+        assert player.reused == visits > 0
+        assert reply.visits == visits + 50
+        assert reply.parent is None
+        assert move in m.generate_moves(model.black)
+        assert player.pondering is not None
+    finally:
+        player.close()
+    assert player.pondering is None and player.tree is None
+
+def test_mcts_ponder_miss(m):
+    player = ai.MCTSAI(iterations=20, rollout_depth=10, rng=random.Random(0), ponder=True)
+    try:
+        m.push(player.choose_move(m, model.black))
+        m.push(None)
+        player.choose_move(m, model.black)
+        assert player.reused == 0
+    finally:
+        player.close()
+
+def test_mcts_reuse_tree(m):
+    player = ai.MCTSAI(iterations=100, rollout_depth=10, rng=random.Random(0))
+    m.push(player.choose_move(m, model.black))
+    root, scratch = player.tree
+    assert root.visits == 100
+    ours = max(root.children, key=lambda child: child.visits)
+    reply = max(ours.children, key=lambda child: child.visits)
+    visits = reply.visits
+    m.push(reply.move)
+    player.choose_move(m, model.black)
+    assert player.reused == visits > 0
+    assert reply.parent is None and player.tree[0] is reply
+    assert reply.visits == visits + 100
+
+def test_mcts_without_reuse(m):
+    player = ai.MCTSAI(iterations=50, rollout_depth=10, rng=random.Random(0), reuse_tree=False)
+    m.push(player.choose_move(m, model.black))
+    assert player.tree is None
+    m.push(ai.AI().choose_move(m, model.white))
+    player.choose_move(m, model.black)
+    assert player.reused == 0
@@ -0,0 +1,12 @@
+
+from ponder import benchmark, model
+
+def test_random_positions():
+    positions = benchmark.random_positions(50, seed=1)
+    assert len(positions) == 50 and positions == benchmark.random_positions(50, seed=1)
+    assert all(len(data) == model.bytes_size for data in positions)
+
+def test_benchmark():
+    results = benchmark.benchmark(['dict', 'bitboard', 'ids'], benchmark.random_positions(10), repeat=1)
+    assert set(results) == {task for task, _ in benchmark.tasks}
+    assert all(set(times) == {'dict', 'bitboard', 'ids'} and min(times.values()) > 0 for times in results.values())
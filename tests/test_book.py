@@ -0,0 +1,54 @@
+from ponder import book, model, hexes, records, ai
+from ponder.tuples import Move, Token
+import pytest
+
+black_ant = Token(model.black, model.ant)
+white_ant = Token(model.white, model.ant)
+white_bee = Token(model.white, model.bee)
+
+games = [
+    (model.black, [Move(black_ant, None, hexes.centre), Move(white_ant, None, (0,-1,0))]),
+    (model.black, [Move(black_ant, None, hexes.centre), Move(white_ant, None, (1,-1,0))]),
+    (model.white, [Move(black_ant, None, hexes.centre), Move(white_bee, None, (1,0,0))]),
+    (None, [Move(black_ant, None, hexes.centre), None, Move(Token(model.black, model.spider), None, (0,-1,0))]),
+]
+
+@pytest.fixture
+def opening_book(tmp_path):
+    path = tmp_path / 'games.txt'
+    path.write_text(''.join(records.save_game(winner, moves) + '\n' for winner, moves in games))
+    book.build([path], tmp_path / 'book.bin')
+    b = book.Book(tmp_path / 'book.bin')
+    yield b
+    b.close()
+
+def test_lookup_start(opening_book):
+    m = model.Model()
+    assert opening_book.lookup(m) == [(Move(black_ant, None, hexes.centre), 4, 2, 1)]
+
+def test_lookup_symmetric(opening_book):
+    m = model.Model()
+    m.push(Move(black_ant, None, hexes.centre))
+    entries = opening_book.lookup(m)
+    assert [(move.token, games, wins) for move, games, wins, draws in entries] == [
+        (white_ant, 2, 0), (white_bee, 1, 1)]
+    for move, games, wins, draws in entries:
+        assert move in m.generate_moves(model.white)
+
+def test_lookup_missing(opening_book):
+    m = model.Model()
+    m.push(Move(Token(model.black, model.bee), None, hexes.centre))
+    assert opening_book.lookup(m) == []
+
+def test_book_ai(opening_book):
+    player = book.BookAI(opening_book, ai.AI())
+    m = model.Model()
+    assert player.choose_move(m, model.black) == Move(black_ant, None, hexes.centre)
+    m.push(Move(Token(model.black, model.bee), None, hexes.centre))
+    assert player.choose_move(m, model.white) in m.generate_moves(model.white)
+
+def test_empty_book(tmp_path):
+    book.build([], tmp_path / 'book.bin')
+    b = book.Book(tmp_path / 'book.bin')
+    assert b.lookup(model.Model()) == []
+    b.close()
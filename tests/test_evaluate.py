@@ -0,0 +1,50 @@
+from ponder import evaluate, model, perft
+import numpy as np
+import random
+
+def positions():
+    models = [model.Model()] + [perft.load(name) for name in sorted(perft.positions)]
+    rng = random.Random(3)
+    m = model.Model()
+    for _ in range(30):
+        m.push(m.random_move(m.active_player, rng))
+        if m.winner() is not None:
+            break
+        copy = model.Model()
+        copy.from_bytes(m.to_bytes())
+        models.append(copy)
+    return models
+
+def test_board_features():
+    models = positions()
+    f = evaluate.board_features(evaluate.encode(models))
+    for i, m in enumerate(models):
+        for j, colour in enumerate(model.colours):
+            bee = m.state.bees[colour]
+            neighbours = 0 if bee is None else len(m.occupied_neighbours(bee))
+            assert f['bee_neighbours'][i, j] == neighbours
+            assert f['hand'][i, j] == sum(model.starting_hand[kind] - m.state.counts[model.Token(colour, kind)] for kind in model.kinds)
+
+def test_model_features():
+    m = perft.load('midgame')
+    f = evaluate.model_features([m])
+    for j, colour in enumerate(model.colours):
+        assert f['mobility'][0, j] == m.count_moves(colour)
+        assert f['pinned'][0, j] == len(m.state.active_colours[colour] - m.move_sources())
+
+def test_evaluate_symmetric():
+    models = positions()
+    white = evaluate.evaluate(models, model.white)
+    black = evaluate.evaluate(models, model.black)
+    assert white.shape == (len(models),)
+    assert np.allclose(white + black, 1)
+    assert white[0] == 0.5
+    assert ((0 <= white) & (white <= 1)).all()
+
+def test_evaluate_surrounded():
+    m = model.Model()
+    m.load('0,0,0:white:Bee|1,0,0:black:ant|1,-1,0:black:ant|0,-1,0:black:ant|'
+           '-1,0,0:black:spider|-1,1,0:black:spider|0,1,0:black:beetle')
+    assert m.winner() == model.black
+    assert evaluate.evaluate([m], model.black)[0] == 1.0
+    assert evaluate.evaluate([m], model.white)[0] == 0.0
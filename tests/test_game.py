@@ -0,0 +1,55 @@
+from ponder import game, model, hexes
+from ponder.tuples import Move, Token
+import pytest
+
+black_ant = Token(model.black, model.ant)
+
+def test_make_move():
+    g = game.Game(model.Model(), {})
+    assert g.is_legal(Move(black_ant, None, hexes.centre))
+    assert not g.is_legal(None)
+    with pytest.raises(ValueError):
+        g.make_move(Move(black_ant, None, (1,0,0)))
+    g.make_move(Move(black_ant, None, hexes.centre))
+    assert g.active_player == model.white
+    assert not g.is_legal(Move(None, hexes.centre, (1,0,0)))
+
+def test_pass():
+    g = game.Game(model.Model(), {})
+    g.model.load('0,0,0:black:Bee|1,0,0:black:Bee')
+    g.model.active_player = model.white
+    assert g.is_legal(None)
+    g.make_move(None)
+    assert g.active_player == model.black
+
+def test_trusted():
+    g = game.Game(model.Model(), {}, trusted=True)
+    g.make_move(Move(black_ant, None, (3,0,0)))
+    assert g.model.state[(3,0,0)] == black_ant
+
+def test_pass_with_moves():
+    g = game.Game(model.Model(), {})
+    g.model.load('0,0,0:black:Bee|1,0,0:white:Bee')
+    g.model.active_player = model.white
+    assert g.model.cached_result('legal_moves', model.white) is None
+    assert not g.is_legal(None)
+    g.model.legal_moves(model.white)
+    assert not g.is_legal(None)
+
+def test_is_legal_without_listing():
+    g = game.Game(model.Model(), {})
+    g.make_move(Move(black_ant, None, hexes.centre))
+    assert g.is_legal(Move(Token(model.white, model.bee), None, (1,0,0)))
+    assert not g.is_legal(Move(Token(model.black, model.bee), None, (1,0,0)))
+    assert g.model.cached_result('legal_moves', model.white) is None
+
+def test_is_legal_matches_listed():
+    m = model.Model()
+    m.load('0,0,0:black:Bee|1,0,0:white:Bee|-1,0,0:black:ant|2,0,0:white:beetle')
+    candidates = [Move(None, source, destination) for source in m.state.active for destination in hexes.neighbours(source)]
+    candidates += [Move(Token(model.black, kind), None, place) for kind in model.kinds for place in m.colour_places(model.white)]
+    unlisted = [m.is_legal(model.black, move) for move in candidates]
+    legal = m.legal_move_set(model.black)
+    assert unlisted == [move in legal for move in candidates]
+    assert [m.is_legal(model.black, move) for move in candidates] == unlisted
+    assert any(unlisted) and not all(unlisted)
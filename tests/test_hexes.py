@@ -62,3 +62,22 @@ def test_merge():
     assert hexes.merge(()) == set()
     assert hexes.merge((some_hexes,)) == some_hexes
     assert hexes.merge((some_hexes, some_hexes)) == some_hexes
+
+def test_symmetries():
+    assert len(set(hexes.symmetries)) == 12
+    assert hexes.symmetries[0] == hexes.identity
+    for symmetry in hexes.symmetries:
+        assert set(hexes.transform(symmetry, offset) for offset in hexes.offsets) == set(hexes.offsets)
+        assert hexes.transform(symmetry, hexes.up) == hexes.up
+        test_hex = (2,-5,-1)
+        assert hexes.transform(hexes.inverse(symmetry), hexes.transform(symmetry, test_hex)) == test_hex
+        for other in hexes.symmetries:
+            assert hexes.compose(symmetry, other) in hexes.symmetries
+
+def test_rotation_matches_rotate():
+    for offset in hexes.offsets:
+        assert hexes.transform(hexes.rotation, offset) == hexes.rotate(hexes.right, offset)
+
+def test_reflection():
+    for i in range(6):
+        assert hexes.transform(hexes.reflection, hexes.offsets[i]) == hexes.offsets[5-i]
@@ -0,0 +1,47 @@
+from ponder import hexids, hexes, model
+from ponder.tuples import Token
+import pytest
+
+def test_round_trip():
+    for hex in [hexes.centre, (3,-7,0), (-30,29,-4)]:
+        assert hexids.to_tuple(hexids.from_tuple(hex)) == hex
+    with pytest.raises(ValueError):
+        hexids.from_tuple((40,0,0))
+
+def test_neighbours():
+    for hex in [hexes.centre, (5,-2,0), (1,1,-2)]:
+        id = hexids.from_tuple(hex)
+        assert set(map(hexids.to_tuple, hexids.neighbours(id))) == hexes.neighbours(hex)
+
+def test_rotate():
+    pivot = hexids.from_tuple((2,3,0))
+    for tuple_offset, offset in zip(hexes.offsets, hexids.offsets):
+        for direction in (hexids.left, hexids.right):
+            rotated = hexes.rotate(direction, hexes.add((2,3,0), tuple_offset), (2,3,0))
+            assert hexids.to_tuple(hexids.rotate(direction, pivot + offset, pivot)) == rotated
+    with pytest.raises(ValueError):
+        hexids.rotate(hexids.left, pivot, pivot)
+
+def test_stacks():
+    id = hexids.from_tuple((1,-1,0))
+    assert hexids.to_tuple(hexids.add(id, hexids.down)) == (1,-1,-1)
+    assert hexids.make_active(hexids.add(id, hexids.down)) == id
+    assert not hexids.is_active(hexids.add(id, hexids.down))
+
+def test_model_forms():
+    m = model.Model()
+    m.load('-1,0,0:white:Bee|0,0,-1:black:ant|0,0,0:white:beetle|1,0,0:black:Bee')
+    m.active_player = model.white
+    i = hexids.Model()
+    i.load(m.save())
+    i.active_player = model.white
+    assert i.save() == m.save()
+    assert i.to_bytes() == m.to_bytes()
+    assert i.canonical_hash() == m.canonical_hash()
+    assert sorted(map(hexids.to_tuple, i.move_sources())) == sorted(m.move_sources())
+    assert i.count_moves(model.white) == m.count_moves(model.white)
+
+def test_outside_grid():
+    m = hexids.Model()
+    with pytest.raises(ValueError):
+        m.state[hexids.from_tuple((31,0,0))] = Token(model.white, model.ant)
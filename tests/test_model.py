@@ -1,13 +1,12 @@
 
 from ponder import model, hexes
-from ponder.tuples import Token
+from ponder.tuples import Move, Token
 import random
 import pytest
 
 @pytest.fixture(autouse=True)
-def m():
-    m = model.Model()
-    yield m
+def m(tuple_model_type):
+    return tuple_model_type()
 
 lookup_colour = {colour[0]: colour for colour in model.colours}
 lookup_kind = {kind[0]: kind for kind in model.kinds}
@@ -126,6 +125,74 @@ def test_move_climbing(m):
     assert m.state[hexes.centre] == Token('white', 'Bee')
     assert len(m.state) == 3
 
+# Work out the state's indexes again from the saved board, to check the ones kept up to date move by move.
+def check_indexes(m):
+    board = {}
+    for item in filter(None, m.save().split('|')):
+        loc, colour, kind = item.split(':')
+        board[hexes.load(loc)] = Token(colour, kind)
+    active = set(hex for hex in board if hexes.is_active(hex))
+    assert m.state.active == active
+    assert m.state.tops == {hex: board[hex] for hex in active}
+    # Each token as its column and height from the bottom of the stack.
+    slots = {hex: (hexes.make_active(hex), sum(1 for other in board if hexes.make_active(other) == hexes.make_active(hex))
+                   - 1 + hex[2]) for hex in board}
+    for colour in model.colours:
+        assert m.state.colours[colour] == set(slots[hex] for hex, token in board.items() if token.colour == colour)
+        assert m.colour_hexes(colour) == set(hex for hex, token in board.items() if token.colour == colour)
+        assert m.state.active_colours[colour] == set(hex for hex in active if board[hex].colour == colour)
+        assert m.state.placed[colour] == sum(1 for token in board.values() if token.colour == colour)
+        assert m.state.bees[colour] == next((hex for hex, token in board.items() if token == Token(colour, model.bee)), None)
+    for kind in model.kinds:
+        assert m.state.kinds[kind] == set(slots[hex] for hex, token in board.items() if token.kind == kind)
+        assert m.kind_hexes(kind) == set(hex for hex, token in board.items() if token.kind == kind)
+    for hex in hexes.merge(hexes.neighbours(hex) for hex in active):
+        assert m.state.neighbour_counts[hex] == len(hexes.neighbours(hex) & active)
+    assert len(m.state) == len(board)
+
+def test_state_indexes(m):
+    set_state(m, 'wB bb wa', step=2)
+    check_indexes(m)
+    m.move(hexes.mul(hexes.offsets[0],1), hexes.centre)
+    check_indexes(m)
+    m.move(hexes.mul(hexes.offsets[2],2), hexes.mul(hexes.offsets[0],1))
+    check_indexes(m)
+    m.move(hexes.mul(hexes.offsets[0],1), hexes.centre)
+    check_indexes(m)
+    assert m.state.bees[model.white] == (0,0,-2)
+    m.move(hexes.centre, hexes.mul(hexes.offsets[0],1))
+    check_indexes(m)
+
+def test_state_indexes_random_game(m):
+    rng = random.Random(3)
+    for _ in range(60):
+        m.push(m.random_move(m.active_player, rng))
+        check_indexes(m)
+    while len(m.history) > 0:
+        m.pop()
+        check_indexes(m)
+
+def test_hash(m):
+    empty = m.hash
+    set_state(m, 'wB ba', step=3)
+    start = m.hash
+    assert start != empty
+    m.move(hexes.offsets[0], hexes.centre)
+    climbed = m.hash
+    assert climbed != start
+    m.move(hexes.centre, hexes.offsets[0])
+    assert m.hash == start
+    m.end_turn()
+    assert m.hash != start
+    m.end_turn()
+    assert m.hash == start
+
+    other = type(m)()
+    other.load(m.save())
+    assert other.hash == start
+    other.move(hexes.offsets[0], hexes.centre)
+    assert other.hash == climbed
+
 def test_colour_bee_placed(m):
     assert m.colour_bee_placed(model.white) == False
     assert m.colour_bee_placed(model.black) == False
@@ -170,6 +237,12 @@ def test_colour_places_dont_intersect(m):
     assert len(m.colour_places(model.white)) == 0
     assert len(m.colour_places(model.black)) == 8
 
+def test_colour_places_covered(m):
+    set_state(m, 'wB wa')
+    add_token(m, 'bb')
+    assert all(hexes.is_active(hex) for hex in m.colour_places(model.white))
+    assert len(m.colour_places(model.black)) == 3
+
 def test_places(m):
     set_state(m, 'bB ba bb wh wa wb ba')
     assert m.places() == {model.white:m.colour_places(model.white), model.black:m.colour_places(model.black)}
@@ -197,11 +270,34 @@ def test_move_sources_star(m):
     assert len(m.state) == 1 + 3*7
     assert len(m.move_sources()) == 3
 
+def test_move_sources_long_line():
+    m = model.Model()
+    set_state(m, ' '.join(['wa'] * 5000))
+    assert len(m.move_sources()) == 2
+
+def test_move_sources_stacked(m):
+    set_state(m, 'ba wB ba', step=3)
+    add_token(m, 'wb')
+    assert hexes.centre in m.move_sources()
+    assert len(m.move_sources()) == 3
+
 def test_move_sources_loop(m):
     set_state(m, '- wB', step=1)
     assert len(m.state) == 6
     assert len(m.move_sources()) == 6
 
+def test_move_sources_random_games(m):
+    rng = random.Random(7)
+    for _ in range(5):
+        reference = model.Model()
+        for _ in range(40):
+            move = reference.random_move(reference.active_player, rng)
+            reference.push(move)
+            m.push(move)
+            assert m.move_sources() == reference.move_sources()
+        while len(m.history) > 0:
+            m.pop()
+
 def crawl_graph_assertions(graph):
     for hex, node in graph.items():
         assert len(node.left) > 0
@@ -244,6 +340,21 @@ def test_crawl_graph_loop(m):
     assert len(result) == 12
     assert hexes.centre not in result
 
+def test_perimeter_graph(m):
+    set_state(m, 'wa wh - bh bh')
+    result = m.perimeter_graph()
+    assert set(result) == hexes.merge(m.unoccupied_neighbours(hex) for hex in m.state)
+    for hex in result:
+        assert result[hex] == m.crawl_moves(hex)
+        assert isinstance(result[hex].left, frozenset) and isinstance(result[hex].right, frozenset)
+
+def test_crawl_graph_shared(m):
+    set_state(m, 'wa wh - bh bh')
+    result = m.crawl_graph(hexes.centre)
+    with m.temporarily_remove(hexes.centre):
+        for hex in result:
+            assert result[hex] == m.crawl_moves(hex)
+
 def test_bee_moves_end(m):
     set_state(m, 'wB wa wa wa')
     assert len(m.bee_moves(hexes.centre)) == 2
@@ -395,3 +506,183 @@ def test_moves_loops(m):
     assert moves_helper(m.moves()) == (6,6)
     set_state(m, '- wb', step=1)
     assert moves_helper(m.moves()) == (6,12)
+
+# MOVE GENERATION
+
+def test_generate_moves_empty(m):
+    moves = list(m.generate_moves(model.white))
+    assert len(moves) == 5
+    assert all(move.destination == hexes.centre for move in moves)
+
+def test_generate_moves(m):
+    set_state(m, 'bB wB ba wa bh', step=2)
+    for colour in model.colours:
+        moves = list(m.generate_moves(colour))
+        assert len(moves) == len(set(moves)) == m.count_moves(colour)
+        assert moves == list(m.generate_moves(colour))
+        places = set(move.destination for move in moves if move.source is None)
+        assert places == m.colour_places(colour)
+        for source, destinations in m.colour_moves(colour).items():
+            assert destinations == set(move.destination for move in moves if move.source == source)
+
+def test_legal_moves(m):
+    set_state(m, 'bB wB ba wa bh', step=2)
+    for colour in model.colours:
+        assert m.legal_moves(colour) == tuple(m.generate_moves(colour))
+        assert m.legal_moves(colour) is m.legal_moves(colour)
+        assert m.legal_move_set(colour) == set(m.legal_moves(colour))
+    moves = m.legal_moves(model.black)
+    m.push(moves[0])
+    assert m.legal_moves(model.black) != moves
+    m.pop()
+    assert m.legal_moves(model.black) is moves
+
+def test_random_move(m):
+    set_state(m, 'bB wB ba wa bh', step=2)
+    rng = random.Random(0)
+    moves = set(m.generate_moves(model.black))
+    seen = set(m.random_move(model.black, rng) for _ in range(2000))
+    assert len(moves) > 0
+    assert seen == moves
+
+def test_random_move_cached(m):
+    set_state(m, 'bB wB ba wa bh', step=2)
+    picked = [m.random_move(model.black, random.Random(seed)) for seed in range(20)]
+    assert m.cached_result('legal_moves', model.black) is None
+    m.legal_moves(model.black)
+    assert [m.random_move(model.black, random.Random(seed)) for seed in range(20)] == picked
+
+def test_random_move_none(m):
+    set_state(m, 'bB bB')
+    assert m.count_moves(model.white) == 0
+    assert m.random_move(model.white, random) is None
+
+def test_push_pop(m):
+    set_state(m, 'bB wB ba wa bh wb', step=2)
+    start = m.save(), m.hash, m.active_player
+    moves = list(m.generate_moves(m.active_player))
+    for move in moves:
+        m.push(move)
+        assert m.active_player != start[2]
+        reply = m.random_move(m.active_player, random)
+        m.push(reply)
+        assert m.pop() == reply
+        assert m.pop() == move
+        assert (m.save(), m.hash, m.active_player) == start
+    assert m.history == []
+
+def test_push_pop_climbing(m):
+    set_state(m, 'wB wb', step=3)
+    start = m.save(), m.hash
+    m.push(Move(None, hexes.offsets[0], hexes.centre))
+    m.push(None)
+    m.push(Move(None, hexes.offsets[3], hexes.centre))
+    assert m.state[hexes.centre] == Token('white', 'beetle')
+    assert len(m.state) == 3
+    for _ in range(3):
+        m.pop()
+    assert (m.save(), m.hash) == start
+
+def test_stacks(m):
+    bee, beetle, ant = Token(model.white, model.bee), Token(model.black, model.beetle), Token(model.white, model.ant)
+    m.state[hexes.centre] = bee
+    m.state[hexes.centre] = beetle
+    assert m.state.bee_columns[model.white] is None
+    m.state[hexes.add(hexes.centre, hexes.down)] = ant
+    assert m.state.columns[hexes.centre] == [ant, beetle]
+    assert m.state.tops[hexes.centre] == beetle
+    assert m.state[hexes.add(hexes.centre, hexes.down)] == ant
+    assert set(m.state) == {hexes.centre, hexes.add(hexes.centre, hexes.down)}
+    with pytest.raises(ValueError):
+        m.state[hexes.mul(hexes.down, 3)] = bee
+    m.state.push_top(hexes.centre, bee)
+    assert m.state.height(hexes.centre) == 3
+    assert m.state.bee_columns[model.white] == hexes.centre
+    assert m.state.pop_top(hexes.centre) == bee
+    assert m.state.bee_columns[model.white] is None
+    del m.state[hexes.add(hexes.centre, hexes.down)]
+    assert m.state.columns[hexes.centre] == [beetle]
+    assert m.state.pop((5,5,0), None) is None
+    assert m.state.pop(hexes.centre) == beetle
+    assert len(m.state) == 0 and m.state.hash == 0
+
+# SAVING
+
+def test_bytes_round_trip(m):
+    set_state(m, 'bB wB ba wa bh wb', step=2)
+    add_token(m, 'bb')
+    add_token(m, 'wb')
+    m.end_turn()
+    data = m.to_bytes()
+    assert len(data) == model.bytes_size
+
+    other = type(m)()
+    other.from_bytes(data)
+    assert other.save() == m.save()
+    assert other.hash == m.hash
+    assert other.active_player == model.white
+    assert other.to_bytes() == data
+
+def test_bytes_indexes(m):
+    rng = random.Random(8)
+    for _ in range(40):
+        m.push(m.random_move(m.active_player, rng))
+    other = type(m)()
+    set_state(other, 'wB bB')
+    other.from_bytes(m.to_bytes())
+    check_indexes(other)
+    assert (other.save(), other.hash, other.legal_moves(other.active_player)) == (
+        m.save(), m.hash, m.legal_moves(m.active_player))
+
+def test_bytes_gap(m):
+    data = bytearray(m.to_bytes())
+    model.slot.pack_into(data, 1, 0, 0, -1, model.token_codes[Token(model.white, model.bee)])
+    with pytest.raises(ValueError):
+        type(m)().from_bytes(bytes(data))
+
+def test_bytes_empty(m):
+    other = type(m)()
+    other.from_bytes(m.to_bytes())
+    assert len(other.state) == 0
+    assert other.active_player == model.black
+
+def test_bytes_too_many_tokens(m):
+    set_state(m, ' '.join(['wa'] * 5), step=1)
+    with pytest.raises(ValueError):
+        m.to_bytes()
+
+# SYMMETRY
+
+def transformed_copy(m, symmetry, translation):
+    other = type(m)()
+    for hex, token in m.state.items():
+        other.state[hexes.add(hexes.transform(symmetry, hex), translation)] = token
+    other.active_player = m.active_player
+    return other
+
+def test_canonical_hash(m):
+    set_state(m, 'bB wB ba - wa bh', step=2)
+    add_token(m, 'wb', hexes.offsets[0])
+    hash = m.canonical_hash()
+    for symmetry in hexes.symmetries:
+        other = transformed_copy(m, symmetry, (2,-1,0))
+        assert other.canonical_hash() == hash
+        assert other.canonical()[0] == m.canonical()[0]
+
+def test_canonical_hash_differs(m):
+    set_state(m, 'bB wB ba wa bh', step=2)
+    hash = m.canonical_hash()
+    m.move(hexes.mul(hexes.offsets[0], 4), hexes.add(hexes.mul(hexes.offsets[0], 4), hexes.offsets[1]))
+    assert m.canonical_hash() != hash
+    m.move(hexes.add(hexes.mul(hexes.offsets[0], 4), hexes.offsets[1]), hexes.mul(hexes.offsets[0], 4))
+    assert m.canonical_hash() == hash
+    m.end_turn()
+    assert m.canonical_hash() != hash
+
+def test_canonical_maps_hexes(m):
+    set_state(m, 'bB wB ba wa bh', step=2)
+    hash, symmetry, origin = m.canonical()
+    other = type(m)()
+    for hex, token in m.state.items():
+        other.state[hexes.sub(hexes.transform(symmetry, hex), origin)] = token
+    assert other.canonical()[0] == hash == other.state.hash
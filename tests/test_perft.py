@@ -0,0 +1,21 @@
+from ponder import perft
+import pytest
+
+pytestmark = pytest.mark.perft
+
+@pytest.mark.parametrize('name', sorted(perft.positions))
+@pytest.mark.parametrize('depth', [1, 2])
+def test_perft(model_type, name, depth):
+    m = perft.load(name, model_type)
+    start = m.save(), m.hash
+    assert perft.perft(m, depth) == perft.expected(name, depth)
+    assert (m.save(), m.hash) == start
+
+@pytest.mark.parametrize('name', ['start', 'opening'])
+def test_perft_deeper(model_type, name):
+    m = perft.load(name, model_type)
+    assert perft.perft(m, 3) == perft.expected(name, 3)
+
+def test_expected():
+    assert perft.expected('start', 1) == 5
+    assert perft.expected('start', 10) is None
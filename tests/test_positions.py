@@ -0,0 +1,120 @@
+
+from ponder import model, positions
+from ponder.tuples import Move
+import random
+import threading
+import pytest
+
+# Play a random game of `plies` moves on a model, keeping the position after each move.
+def random_game(m, plies, rng):
+    line = [positions.Position.start(m)]
+    for _ in range(plies):
+        move = m.random_move(m.active_player, rng)
+        m.push(move)
+        line.append(line[-1].play(move))
+    return line
+
+def test_start_copies_model(model_type):
+    m = model_type()
+    start = positions.Position.start(m)
+    m.push(m.random_move(m.active_player, random.Random(0)))
+    assert start.save() == '' and start.history == []
+    assert start.active_player == model.black and m.active_player == model.white
+
+def test_play_leaves_parent(model_type):
+    m = model_type()
+    start = positions.Position.start(m)
+    child = start.play(start.legal_moves(start.active_player)[0])
+    assert child.parent is start and child.plies == 1
+    assert child.active_player == model.white
+    assert len(child.save()) > 0
+    assert start.save() == '' and start.hash == m.hash
+    assert len(child.colour_places(model.white)) == 6
+
+def test_positions_match_model(model_type):
+    rng = random.Random(1)
+    m = model_type()
+    line = random_game(m, 30, rng)
+    expected = []
+    while True:
+        expected.append((m.save(), m.hash, m.winner(), m.legal_moves(m.active_player),
+                         m.colour_moves(model.white), m.colour_places(model.black)))
+        if len(m.history) == 0:
+            break
+        m.pop()
+    expected.reverse()
+    # Asked about in any order, each position is the same as the model was at that point.
+    for ply in rng.sample(range(len(line)), len(line)):
+        position = line[ply]
+        assert (position.save(), position.hash, position.winner(), position.legal_moves(position.active_player),
+                position.colour_moves(model.white), position.colour_places(model.black)) == expected[ply]
+
+def test_branches_share_parents(model_type):
+    rng = random.Random(2)
+    m = model_type()
+    line = random_game(m, 10, rng)
+    branch = line[5]
+    moves = branch.legal_moves(branch.active_player)[:2]
+    children = [branch.play(move) for move in moves]
+    assert all(child.parent is branch for child in children)
+    for move, child in zip(moves, children):
+        other = model_type()
+        for earlier in child.history:
+            other.push(earlier)
+        assert child.history[-1] == move and child.plies == 6
+        assert (child.save(), child.hash) == (other.save(), other.hash)
+        assert line[-1].hash == m.hash
+
+def test_illegal_move(model_type):
+    m = model_type()
+    line = random_game(m, 6, random.Random(4))
+    sibling = line[3].play(line[3].legal_moves(line[3].active_player)[-1])
+    expected = [(position.save(), position.hash) for position in line + [sibling]]
+    with pytest.raises(ValueError):
+        line[3].play(Move(None, (9,9,0), (0,0,0)))
+    with pytest.raises(ValueError):
+        line[3].play(None)
+    assert [(position.save(), position.hash) for position in line + [sibling]] == expected
+    with pytest.raises(AttributeError):
+        sibling.move = None
+
+def test_stacks_shared(model_type):
+    rng = random.Random(5)
+    m = model_type()
+    line = random_game(m, 12, rng)
+    branch = line[-1]
+    for move in branch.legal_moves(branch.active_player)[:5]:
+        child = branch.play(move)
+        changed = [index for index, (ours, theirs) in enumerate(zip(child.buckets, branch.buckets)) if ours is not theirs]
+        assert 1 <= len(changed) <= 2
+        # Only the stacks the move touches are new.
+        new = [column for index in changed for column, stack in child.buckets[index].items()
+               if branch.buckets[index].get(column) is not stack]
+        assert set(new) == {move.destination}
+
+def test_far_apart(model_type):
+    rng = random.Random(7)
+    first = random_game(model_type(), 16, rng)
+    second = random_game(model_type(), 16, rng)
+    for ply in range(16, -1, -1):
+        for position in (first[ply], second[ply], first[-1]):
+            other = model_type()
+            for move in position.history:
+                other.push(move)
+            assert (position.save(), position.hash, position.canonical_hash()) == (other.save(), other.hash, other.canonical_hash())
+
+def test_threads(model_type):
+    m = model_type()
+    line = random_game(m, 20, random.Random(6))
+    expected = [position.save() for position in line]
+    results = {}
+    def ask(name, order):
+        results[name] = [(ply, line[ply].save()) for _ in range(20) for ply in order]
+    threads = [threading.Thread(target=ask, args=(name, order)) for name, order in
+               (('up', range(len(line))), ('down', range(len(line)-1, -1, -1)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for name in results:
+        assert all(save == expected[ply] for ply, save in results[name])
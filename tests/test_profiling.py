@@ -0,0 +1,40 @@
+from ponder import ai, game, model, perft, profiling
+import random
+
+def test_counts(model_type):
+    m = perft.load('midgame', model_type)
+    sources = len(m.colour_sources(model.black))
+    profiler = m.profile()
+    moves = m.count_moves(model.black)
+    report = profiler.report()
+    assert report['functions']['count_moves'][0] == 1
+    assert report['functions']['source_moves'][0] == sources
+    assert sum(calls for calls, seconds in report['kinds'].values()) == report['functions']['source_moves'][0]
+    profiler.disable()
+    assert m.count_moves(model.black) == moves
+    assert profiler.report() == report
+    assert 'move_lookup' not in vars(m) and 'count_moves' not in vars(m)
+
+def test_disabled_costs_nothing(model_type):
+    m = perft.load('midgame', model_type)
+    assert not any(name in vars(m) for name in profiling.functions)
+    assert m.move_lookup is model_type.move_lookup
+
+def test_format_report():
+    m = perft.load('early')
+    profiler = m.profile()
+    m.count_moves(model.white)
+    profiler.disable()
+    text = profiling.format_report(profiler.report())
+    assert 'count_moves' in text and 'calls' in text
+
+def test_play_profile():
+    random.seed(2)
+    g = game.Game(model.Model(), {model.black: ai.AI(), model.white: ai.AI()})
+    winner, report = g.play(20, profile=True)
+    assert winner == g.model.winner()
+    assert report['plies'] == len(g.model.history)
+    assert report['functions']['winner'][0] > report['plies']
+    assert set(report['thinking']) == set(model.colours)
+    assert 'winner' not in vars(g.model)
+    assert g.play(2) == g.model.winner()
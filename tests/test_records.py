@@ -0,0 +1,19 @@
+from ponder import records, model, hexes
+from ponder.tuples import Move, Token
+
+moves = [
+    Move(Token(model.black, model.ant), None, hexes.centre),
+    Move(Token(model.white, model.bee), None, (0,-1,0)),
+    None,
+    Move(None, (0,-1,0), (1,-1,0)),
+    Move(None, (1,-1,0), (0,0,0)),
+]
+
+def test_move_round_trip():
+    for move in moves:
+        assert records.load_move(records.save_move(move)) == move
+
+def test_game_round_trip():
+    assert records.load_game(records.save_game(model.white, moves)) == (model.white, moves)
+    assert records.load_game(records.save_game(None, moves) + '\n') == (None, moves)
+    assert records.load_game(records.save_game(None, [])) == (None, [])
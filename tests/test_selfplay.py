@@ -0,0 +1,24 @@
+from ponder import selfplay, records, model, game, ai
+import io
+
+def test_run(tmp_path):
+    path = tmp_path / 'games.txt'
+    out = io.StringIO()
+    games, plies, elapsed = selfplay.run(ai.AI, ai.AI, 4, path, workers=2, max_plies=30, seed=0, out=out)
+    assert games == 4
+    assert 'games/s' in out.getvalue()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 4
+    assert sum(len(records.load_game(line)[1]) for line in lines) == plies
+    for line in lines:
+        winner, moves = records.load_game(line)
+        g = game.Game(model.Model(), {})
+        for move in moves:
+            g.make_move(move)
+        assert g.model.winner() == winner
+
+def test_make_player():
+    assert isinstance(selfplay.make_player('random')(), ai.AI)
+    assert isinstance(selfplay.make_player('rollout')(), ai.RolloutPolicy)
+    assert selfplay.make_player('mcts:50')().iterations == 50
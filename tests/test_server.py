@@ -0,0 +1,127 @@
+from ponder import server, model, records, game
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+
+def talk(lines, **options):
+    async def run():
+        s = server.Server(**{'executor': ThreadPoolExecutor(2), **options})
+        listener = await s.start()
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+        replies = []
+        for line in lines:
+            writer.write(line + b'\n' if isinstance(line, bytes) else (line + '\n').encode())
+            await writer.drain()
+            if line != 'QUIT':
+                replies.append((await reader.readline()).decode().strip())
+        assert await reader.readline() == b''
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        s.close()
+        return replies
+    return asyncio.run(run())
+
+def test_human_game():
+    replies = talk(['NEW human human', 'MOVE 1 black:ant:0,0,0', 'STATE 1', 'MOVE 1 black:ant:1,0,0', 'QUIT'])
+    assert replies[:3] == ['OK 1', 'OK 1', 'OK 1 white black:ant:0,0,0']
+    assert replies[3].startswith('ERROR illegal move')
+
+def test_against_ai():
+    replies = talk(['NEW human random', 'MOVE 1 black:spider:0,0,0', 'STATE 1', 'MOVES 1', 'QUIT'])
+    assert replies[:2] == ['OK 1', 'OK 1']
+    _, id, status, moves = replies[2].split(' ')
+    assert status == model.black
+    moves = [records.load_move(move) for move in moves.split('|')]
+    assert len(moves) == 2 and moves[1].token.colour == model.white
+    g = game.Game(model.Model(), {})
+    for move in moves:
+        g.make_move(move)
+    legal = replies[3].split(' ')[2].split('|')
+    assert sorted(legal) == sorted(records.save_move(move) for move in g.model.generate_moves(model.black))
+
+def test_bots_in_processes():
+    replies = talk(['NEW random random', 'STATE 1', 'MOVE 1 pass', 'QUIT'], executor=None, workers=2,
+                   max_plies=10)
+    assert replies[0] == 'OK 1'
+    _, _, status, moves = replies[1].split(' ')
+    assert status in ('draw', 'black-wins', 'white-wins')
+    assert replies[2] == 'ERROR game over'
+
+def test_errors():
+    replies = talk(['NEW human nobody', 'STATE 7', 'JUMP', 'STATE', 'NEW random human', 'MOVE 1 pass', 'QUIT'])
+    assert replies[0].startswith('ERROR')
+    assert replies[1] == 'ERROR no game 7'
+    assert replies[2] == 'ERROR unknown command JUMP'
+    assert replies[3] == 'ERROR STATE takes 1 arguments'
+    assert replies[4] == 'OK 1'
+    assert replies[5] == 'ERROR illegal move pass'
+
+def test_many_games():
+    replies = talk(['NEW human human'] * 1000 + ['MOVE 1000 white:Bee:0,0,0', 'QUIT'])
+    assert replies[999] == 'OK 1000'
+    assert replies[1000].startswith('ERROR')
+
+def test_unix_socket(tmp_path):
+    async def run():
+        s = server.Server(executor=ThreadPoolExecutor(1))
+        listener = await s.start(path=str(tmp_path / 'ponder.sock'))
+        reader, writer = await asyncio.open_unix_connection(str(tmp_path / 'ponder.sock'))
+        writer.write(b'NEW human human\nQUIT\n')
+        reply = await reader.readline()
+        writer.close()
+        listener.close()
+        s.close()
+        return reply
+    assert asyncio.run(run()) == b'OK 1\n'
+
+def test_end():
+    replies = talk(['NEW human human', 'END 1', 'STATE 1', 'END 1', 'QUIT'])
+    assert replies == ['OK 1', 'OK 1', 'ERROR no game 1', 'ERROR no game 1']
+
+def test_expire_finished():
+    replies = talk(['NEW human human', 'NEW human human', 'MOVE 1 black:ant:0,0,0', 'STATE 1',
+                    'NEW human human', 'STATE 1', 'STATE 2', 'QUIT'], max_plies=1, linger=0)
+    assert replies[3] == 'OK 1 draw black:ant:0,0,0'
+    assert replies[5] == 'ERROR no game 1'
+    assert replies[6] == 'OK 2 black'
+
+def test_expire_idle():
+    replies = talk(['NEW human human', 'NEW human human', 'STATE 1', 'QUIT'], idle=0)
+    assert replies == ['OK 1', 'OK 2', 'ERROR no game 1']
+
+def test_not_utf8():
+    replies = talk([b'NEW \xff human', 'NEW human human', 'QUIT'])
+    assert replies == ['ERROR not UTF-8', 'OK 1']
+
+class FailingExecutor(ThreadPoolExecutor):
+    def submit(self, *args):
+        raise RuntimeError('no workers')
+
+def test_new_fails():
+    async def run():
+        s = server.Server(executor=FailingExecutor(1))
+        try:
+            await s.new('random', 'human')
+        except RuntimeError:
+            pass
+        else:
+            assert False
+        assert s.sessions == {}
+        s.close()
+    asyncio.run(run())
+
+def test_cache_bounded():
+    async def run():
+        s = server.Server(executor=ThreadPoolExecutor(1), max_plies=120)
+        id = await s.new('human', 'human')
+        m = s.sessions[id].game.model
+        sizes = []
+        while not s.sessions[id].over():
+            moves = (await s.moves(id)).split(' ')[1].split('|')
+            sizes.append(len(m.cache))
+            await s.move(id, moves[len(m.history) % len(moves)])
+        s.close()
+        return sizes
+    sizes = asyncio.run(run())
+    # Only what was worked out for the position the game is in, rather than for every position it has been through.
+    assert len(sizes) > 50 and max(sizes) < 20
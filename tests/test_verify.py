@@ -0,0 +1,41 @@
+from ponder import verify, records, model, selfplay, ai
+import gzip
+
+good = 'draw|black:ant:0,0,0|white:Bee:0,-1,0|black:Bee:1,0,0|0,-1,0:1,-1,0'
+
+def test_verify_game():
+    assert verify.verify_game(good) == (4, None)
+    assert verify.verify_game('draw') == (0, None)
+    assert verify.verify_game('black|black:ant:0,0,0') == (2, 'result black but the winner is nobody')
+    assert verify.verify_game('nobody|black:ant:0,0,0') == (0, "unknown result 'nobody'")
+    assert verify.verify_game('draw|black:ant:0,0,0|white:ant:3,0,0') == (2, 'illegal move white:ant:3,0,0')
+    assert verify.verify_game('draw|black:ant:0,0,0|white:ant:x') == (2, "unreadable move 'white:ant:x'")
+    assert verify.verify_game('draw|black:ant:0,0,0|pass') == (2, 'illegal move pass')
+    assert verify.verify_game('draw|0,0,0:1,0,0') == (1, 'illegal move 0,0,0:1,0,0')
+
+def test_verify_files(tmp_path):
+    path = tmp_path / 'games.txt'
+    selfplay.run(ai.AI, ai.AI, 20, path, workers=2, max_plies=40, seed=1, report_every=0)
+    lines = path.read_text().splitlines()
+    lines[7] = lines[7].replace('|', '|white:Bee:9,9,0|', 1)
+    path.write_text('\n'.join(lines) + '\n\n')
+    packed = tmp_path / 'games.txt.gz'
+    with gzip.open(packed, 'wt') as f:
+        f.write('\n'.join(lines[:5]) + '\n')
+
+    stats = {}
+    problems = list(verify.verify([path, packed], workers=2, batch_size=3, stats=stats))
+    assert problems == [(path, 8, 1, 'illegal move white:Bee:9,9,0')]
+    assert stats['games'] == 25
+    lengths = [len(records.load_game(line)[1]) for line in lines]
+    assert stats['plies'] == sum(lengths) - lengths[7] + sum(lengths[:5])
+
+def test_read_games(tmp_path):
+    path = tmp_path / 'games.txt.gz'
+    with gzip.open(path, 'wt') as f:
+        f.write(good + '\n\n' + 'white\n')
+    games = records.read_games(path)
+    assert next(games)[1][0] == records.load_move('black:ant:0,0,0')
+    assert next(games) == (model.white, [])
+    assert list(games) == []
+    assert list(records.read_lines(path)) == [(1, good), (3, 'white')]